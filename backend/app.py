@@ -1,26 +1,110 @@
+import os
+import time
+_import_started = time.perf_counter()
+
 from flask import Flask, request, jsonify
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
 from config import Config
-from models import Database, UserModel, FaceEncodingModel, AttendanceModel
-from utils.face_recognition import FaceRecognitionHandler
+from models import Database, UserModel, AttendanceModel, get_pool
+from utils.face_recognition import FaceRecognitionHandler, validate_face_profiles
 from utils.n8n_webhook import N8NWebhook
 from utils.emotion_detector import EmotionDetector
+from utils.encoding_cache import EncodingCache
+from utils.checkin_cache import CheckinCache
+from utils.checkin_batcher import CheckinBatcher
+from utils.face_gallery import compute_centroid
+from utils.mood_worker import MoodWorker
+from utils.startup import Warmup, timed, record_timing, get_timings
 from datetime import datetime
 
+# Model berat (dlib, FER/TensorFlow) tidak ikut dihitung: di-load lazy / saat warm-up
+record_timing('import:app', time.perf_counter() - _import_started)
+
 app = Flask(__name__)
 CORS(app)
 app.config.from_object(Config)
 
-# Initialize handlers
-face_handler = FaceRecognitionHandler()
-n8n_webhook = N8NWebhook()
-emotion_detector = EmotionDetector()
+# Initialize handlers (model di-load saat pertama dipakai atau saat warm-up)
+with timed('init:handlers'):
+    face_handler = FaceRecognitionHandler()
+    n8n_webhook = N8NWebhook()
+    emotion_detector = EmotionDetector()
+
+# Warm-up model paralel di background (STARTUP_WARMUP), status di /api/ready
+warmup = Warmup()
+
+def start_warmup(wait=False, only=None):
+    """
+    Load dlib + FER/MTCNN paralel dengan dummy inference (sekali per process)
+    only: subset nama task, misalnya ('dlib',) di master gunicorn sebelum fork
+    """
+    if not Config.STARTUP_WARMUP:
+        return False
+    tasks = {
+        'dlib': face_handler.warm_up,
+        'emotion': emotion_detector.warm_up
+    }
+    if only is not None:
+        tasks = {name: fn for name, fn in tasks.items() if name in only}
+    return warmup.start(tasks, wait=wait)
+
+# Process-level cache untuk semua face encodings
+encoding_cache = EncodingCache()
+
+# User yang sudah absen hari ini (reset otomatis saat ganti hari)
+checkin_cache = CheckinCache()
+
+# Background worker untuk deferred emotion detection (EMOTION_DEFERRED=True)
+mood_worker = MoodWorker(emotion_detector)
 
 def get_db():
+    """Pinjam koneksi dari pool. Pakai `with get_db() as db:` agar selalu dikembalikan"""
     db = Database()
     db.connect()
     return db
 
+# Micro-batching check-in (CHECKIN_BATCH_ENABLED=True)
+checkin_batcher = CheckinBatcher(face_handler, encoding_cache, checkin_cache, get_db)
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    """Upload melebihi MAX_CONTENT_LENGTH -> 413 dengan format error yang sama"""
+    return jsonify({'error': f'Request terlalu besar (maksimal {Config.MAX_CONTENT_LENGTH // (1024 * 1024)} MB)'}), 413
+
+def read_request_images():
+    """
+    Ambil gambar dari request dalam salah satu format:
+    - multipart/form-data: file 'images' (boleh berulang) atau 'image', field lain di form
+    - raw body image/* atau application/octet-stream: satu gambar, field lain di query string
+    - JSON (lama): 'images' / 'image' berisi base64 data URL
+    Returns: (images, fields). images berisi bytes (upload) atau string base64 (JSON)
+    """
+    mimetype = request.mimetype or ''
+    
+    if mimetype == 'multipart/form-data':
+        files = request.files.getlist('images') + request.files.getlist('image')
+        return [f.read() for f in files], request.form.to_dict()
+    
+    if mimetype.startswith('image/') or mimetype == 'application/octet-stream':
+        # Baca body bertahap ke satu buffer (dibatasi MAX_CONTENT_LENGTH)
+        buffer = bytearray()
+        while True:
+            chunk = request.stream.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer.extend(chunk)
+        return ([bytes(buffer)] if buffer else []), request.args.to_dict()
+    
+    data = request.get_json(silent=True) or {}
+    images = data.get('images')
+    if images is None:
+        images = [data['image']] if data.get('image') else []
+    return images, data
+
 # ============= REGISTER ROUTES =============
 
 @app.route('/api/register/check-nim', methods=['POST'])
@@ -33,11 +117,9 @@ def check_nim():
         if not nim:
             return jsonify({'error': 'NIM is required'}), 400
         
-        db = get_db()
-        user_model = UserModel(db)
-        
-        exists = user_model.check_nim_exists(nim)
-        db.close()
+        with get_db() as db:
+            user_model = UserModel(db)
+            exists = user_model.check_nim_exists(nim)
         
         return jsonify({'exists': exists})
         
@@ -48,10 +130,9 @@ def check_nim():
 def register_user():
     """Register new user with face encodings"""
     try:
-        data = request.get_json()
+        images, data = read_request_images()
         nama = data.get('nama')
         nim = data.get('nim')
-        images = data.get('images', [])
         
         if not nama or not nim:
             return jsonify({'error': 'Nama dan NIM harus diisi'}), 400
@@ -59,32 +140,32 @@ def register_user():
         if len(images) < Config.MIN_FACE_ENCODINGS:
             return jsonify({'error': f'Minimal {Config.MIN_FACE_ENCODINGS} foto diperlukan'}), 400
         
-        db = get_db()
-        user_model = UserModel(db)
-        face_model = FaceEncodingModel(db)
-        
-        if user_model.check_nim_exists(nim):
-            db.close()
-            return jsonify({'error': 'NIM sudah terdaftar'}), 400
+        with get_db() as db:
+            if UserModel(db).check_nim_exists(nim):
+                return jsonify({'error': 'NIM sudah terdaftar'}), 400
         
+        # Proses gambar tanpa memegang koneksi pool
         encodings = face_handler.process_multiple_images(images)
         
         if len(encodings) < Config.MIN_FACE_ENCODINGS:
-            db.close()
             return jsonify({
                 'error': f'Hanya {len(encodings)} foto valid dari {len(images)}. Minimal {Config.MIN_FACE_ENCODINGS} foto diperlukan'
             }), 400
         
-        user = user_model.create_user(nama, nim)
+        # Centroid + spread untuk prefilter matching
+        centroid, spread = compute_centroid(encodings)
+        
+        # User + encodings + centroid + generation dalam satu transaksi
+        with get_db() as db:
+            user, generation = UserModel(db).create_user_with_encodings(
+                nama, nim, encodings, centroid, spread
+            )
         
         if not user:
-            db.close()
             return jsonify({'error': 'Gagal membuat user'}), 500
         
-        for encoding in encodings:
-            face_model.save_encoding(user['id'], encoding)
-        
-        db.close()
+        # Update cache secara incremental
+        encoding_cache.add_user(user, encodings, generation, (centroid, spread))
         
         return jsonify({
             'success': True,
@@ -97,24 +178,35 @@ def register_user():
             }
         }), 201
         
+    except HTTPException:
+        # 413 (MAX_CONTENT_LENGTH) / 400 dari parsing upload, bukan 500
+        raise
     except Exception as e:
         print(f"Register error: {e}")
         return jsonify({'error': str(e)}), 500
 
 # ============= ATTENDANCE ROUTES =============
 
+def build_emotion_response(emotion, emotion_confidence, emoji, emotion_indonesian):
+    return {
+        'detected': emotion,
+        'indonesian': emotion_indonesian,
+        'emoji': emoji,
+        'confidence': float(emotion_confidence),
+        'color': emotion_detector.get_emotion_color(emotion)
+    }
+
 @app.route('/api/attendance/check', methods=['POST'])
 def check_attendance():
     """Check attendance using face recognition + emotion detection"""
     try:
-        data = request.get_json()
-        image = data.get('image')
+        images, _ = read_request_images()
         
-        if not image:
+        if not images:
             return jsonify({'error': 'Image is required'}), 400
         
-        # Convert base64 to image
-        img_array = face_handler.base64_to_image(image)
+        # Decode base64 (JSON) atau bytes (upload)
+        img_array = face_handler.decode_image(images[0], fast=True)
         
         if img_array is None:
             return jsonify({'error': 'Invalid image format'}), 400
@@ -124,49 +216,61 @@ def check_attendance():
         if not is_valid:
             return jsonify({'error': error_msg}), 400
         
-        # Extract face encoding
-        face_encoding, error = face_handler.encode_face(img_array)
-        
-        if error:
-            return jsonify({'error': error}), 400
-        
-        # Detect emotion
-        emotion, emotion_confidence, emoji, emotion_indonesian = emotion_detector.detect_emotion(img_array)
-        emotion_color = emotion_detector.get_emotion_color(emotion)
-        
-        # Get all known encodings from database
-        db = get_db()
-        face_model = FaceEncodingModel(db)
-        known_encodings = face_model.get_all_encodings()
-        
-        if not known_encodings:
-            db.close()
-            return jsonify({'error': 'Belum ada data wajah terdaftar'}), 404
-        
-        # Compare faces
-        match, user_data, confidence = face_handler.compare_faces(known_encodings, face_encoding)
-        
+        if Config.CHECKIN_BATCH_ENABLED:
+            # Deteksi di request ini, encode + match + cek absen digabung dengan request lain
+            face_location, error = face_handler.detect_face(img_array)
+            
+            if error:
+                return jsonify({'error': error}), 400
+            
+            future = checkin_batcher.submit(img_array, face_location)
+            try:
+                batch_result = future.result(timeout=Config.CHECKIN_BATCH_TIMEOUT)
+            except FuturesTimeoutError:
+                # Batcher tertahan: jangan blok thread request tanpa batas
+                future.cancel()
+                return jsonify({'error': 'Server sibuk, coba lagi'}), 503
+            
+            if batch_result['gallery_empty']:
+                return jsonify({'error': 'Belum ada data wajah terdaftar'}), 404
+            
+            match = batch_result['match']
+            user_data = batch_result['user_data']
+            confidence = batch_result['confidence']
+        else:
+            # Extract face encoding (face box dideteksi sekali, dipakai ulang untuk emotion)
+            face_encoding, face_location, error = face_handler.detect_and_encode(img_array)
+            
+            if error:
+                return jsonify({'error': error}), 400
+            
+            # Get all known encodings (cached, reload hanya jika generation berubah)
+            with get_db() as db:
+                gallery = encoding_cache.get_gallery(db)
+            
+            if len(gallery) == 0:
+                return jsonify({'error': 'Belum ada data wajah terdaftar'}), 404
+            
+            # Compare faces
+            match, user_data, confidence = face_handler.compare_faces(gallery, face_encoding)
+        
+        # Emotion detection di-skip jika wajah tidak dikenali
         if not match:
-            db.close()
             return jsonify({
                 'recognized': False,
                 'message': 'Wajah tidak dikenali',
                 'confidence': float(confidence),
-                'emotion': {
-                    'detected': emotion,
-                    'indonesian': emotion_indonesian,
-                    'emoji': emoji,
-                    'confidence': float(emotion_confidence),
-                    'color': emotion_color
-                }
+                'emotion': None
             }), 200
         
-        # Check if already recorded today
-        attendance_model = AttendanceModel(db)
-        today_attendance = attendance_model.get_today_attendance(user_data['user_id'])
+        # Check if already recorded today (cache per-process dulu, lalu index lookup)
+        if Config.CHECKIN_BATCH_ENABLED:
+            last_attendance = batch_result['last_attendance']
+        else:
+            last_attendance = checkin_cache.get_last_checkin(get_db, user_data['user_id'])
         
-        if today_attendance and len(today_attendance) > 0:
-            db.close()
+        # Emotion detection di-skip jika sudah absen hari ini
+        if last_attendance is not None:
             return jsonify({
                 'recognized': True,
                 'already_recorded': True,
@@ -175,29 +279,39 @@ def check_attendance():
                     'nama': user_data['nama'],
                     'nim': user_data['nim']
                 },
-                'last_attendance': today_attendance[0]['timestamp'].isoformat() if isinstance(today_attendance[0]['timestamp'], datetime) else str(today_attendance[0]['timestamp']),
-                'emotion': {
-                    'detected': emotion,
-                    'indonesian': emotion_indonesian,
-                    'emoji': emoji,
-                    'confidence': float(emotion_confidence),
-                    'color': emotion_color
-                }
+                'last_attendance': last_attendance.isoformat() if isinstance(last_attendance, datetime) else str(last_attendance),
+                'emotion': None
             }), 200
         
-        # Record attendance WITH MOOD
-        attendance_record = attendance_model.record_attendance(
-            user_data['user_id'],
-            float(confidence),
-            'hadir',
-            emotion,
-            float(emotion_confidence),
-            emoji
+        if Config.EMOTION_DEFERRED:
+            # Mood dianalisis di background, response tidak menunggu
+            emotion = emotion_confidence = emoji = None
+            emotion_response = None
+        else:
+            # Detect emotion pada ROI wajah (tanpa deteksi ulang MTCNN)
+            emotion, emotion_confidence, emoji, emotion_indonesian = emotion_detector.detect_emotion(
+                img_array, face_location=face_location
+            )
+            emotion_confidence = float(emotion_confidence)
+            emotion_response = build_emotion_response(emotion, emotion_confidence, emoji, emotion_indonesian)
+        
+        # Record attendance WITH MOOD (NULL jika deferred)
+        with get_db() as db:
+            attendance_record = AttendanceModel(db).record_attendance(
+                user_data['user_id'],
+                float(confidence),
+                'hadir',
+                emotion,
+                emotion_confidence,
+                emoji
+            )
+        checkin_cache.mark(user_data['user_id'], attendance_record['timestamp'])
+        
+        mood_pending = Config.EMOTION_DEFERRED and mood_worker.submit(
+            attendance_record['id'], img_array, face_location
         )
         
-        db.close()
-        
-        # Send notification to n8n
+        # Send notification to n8n (async: langsung return "queued")
         n8n_success, n8n_message = n8n_webhook.send_attendance_notification(
             user_data,
             attendance_record
@@ -212,40 +326,237 @@ def check_attendance():
                 'nim': user_data['nim']
             },
             'attendance': {
+                'id': attendance_record['id'],
                 'timestamp': attendance_record['timestamp'].isoformat() if isinstance(attendance_record['timestamp'], datetime) else str(attendance_record['timestamp']),
                 'confidence': float(confidence),
                 'status': attendance_record['status']
             },
-            'emotion': {
-                'detected': emotion,
-                'indonesian': emotion_indonesian,
-                'emoji': emoji,
-                'confidence': float(emotion_confidence),
-                'color': emotion_color
-            },
+            'emotion': emotion_response,
+            'mood_pending': mood_pending,
             'notification': {
                 'sent': n8n_success,
+                'queued': n8n_webhook.is_async(),
                 'message': n8n_message
             }
         }), 201
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Attendance check error: {e}")
         import traceback
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/attendance/check-batch', methods=['POST'])
+def check_attendance_batch():
+    """
+    Check attendance untuk semua wajah dalam satu atau beberapa frame (kamera kelas)
+    Body: {"images": [base64, ...]}, {"image": base64}, multipart 'images' atau raw image body
+    """
+    try:
+        images, _ = read_request_images()
+        
+        if not images or not isinstance(images, list):
+            return jsonify({'error': 'Images are required'}), 400
+        
+        if len(images) > Config.ATTENDANCE_BATCH_MAX_FRAMES:
+            return jsonify({
+                'error': f'Maksimal {Config.ATTENDANCE_BATCH_MAX_FRAMES} frame per request'
+            }), 400
+        
+        # Detect + encode semua wajah per frame (satu panggilan face_encodings per frame)
+        # validate_image_quality tidak dipakai: dirancang untuk satu wajah close-up
+        faces = []
+        frame_errors = []
+        for frame_index, image in enumerate(images):
+            img_array = face_handler.decode_image(image, fast=True)
+            
+            if img_array is None:
+                frame_errors.append({'frame': frame_index, 'error': 'Invalid image format'})
+                continue
+            
+            encodings, locations, error = face_handler.detect_and_encode_all(img_array)
+            
+            if error:
+                frame_errors.append({'frame': frame_index, 'error': error})
+                continue
+            
+            for encoding, location in zip(encodings, locations):
+                faces.append({
+                    'frame': frame_index,
+                    'image': img_array,
+                    'location': location,
+                    'encoding': encoding
+                })
+        
+        if not faces:
+            return jsonify({
+                'error': 'Tidak ada wajah terdeteksi',
+                'frame_errors': frame_errors
+            }), 400
+        
+        with get_db() as db:
+            gallery = encoding_cache.get_gallery(db)
+        
+        if len(gallery) == 0:
+            return jsonify({'error': 'Belum ada data wajah terdaftar'}), 404
+        
+        # Semua wajah di-match dalam satu operasi matrix
+        matches = face_handler.compare_faces_batch(gallery, [face['encoding'] for face in faces])
+        
+        # Satu user bisa muncul di beberapa frame: ambil wajah dengan confidence tertinggi
+        best_face = {}
+        for index, (match, user_data, confidence) in enumerate(matches):
+            faces[index].update({'match': match, 'user': user_data, 'confidence': float(confidence)})
+            if match:
+                user_id = user_data['user_id']
+                if user_id not in best_face or confidence > faces[best_face[user_id]]['confidence']:
+                    best_face[user_id] = index
+        
+        today_attendance = checkin_cache.get_last_checkins(get_db, list(best_face))
+        
+        to_record = [
+            (user_id, index) for user_id, index in best_face.items()
+            if user_id not in today_attendance
+        ]
+        
+        # Emotion hanya untuk wajah yang akan dicatat
+        emotions = {}
+        pending = []
+        for user_id, index in to_record:
+            face = faces[index]
+            if Config.EMOTION_DEFERRED:
+                emotions[index] = (None, None, None, None)
+            else:
+                emotion, emotion_confidence, emoji, emotion_indonesian = emotion_detector.detect_emotion(
+                    face['image'], face_location=face['location']
+                )
+                emotions[index] = (emotion, float(emotion_confidence), emoji, emotion_indonesian)
+            pending.append((user_id, face['confidence'], *emotions[index][:3]))
+        
+        # Satu multi-row INSERT untuk semua attendance baru
+        with get_db() as db:
+            records = AttendanceModel(db).record_attendance_batch(pending)
+        
+        recorded = {}
+        mood_pending = False
+        for (user_id, index), attendance_record in zip(to_record, records):
+            recorded[index] = attendance_record
+            checkin_cache.mark(user_id, attendance_record['timestamp'])
+            
+            if Config.EMOTION_DEFERRED:
+                queued = mood_worker.submit(attendance_record['id'], faces[index]['image'], faces[index]['location'])
+                mood_pending = mood_pending or queued
+            
+            n8n_webhook.send_attendance_notification(faces[index]['user'], attendance_record)
+        
+        results = []
+        for index, face in enumerate(faces):
+            top, right, bottom, left = face['location']
+            result = {
+                'frame': face['frame'],
+                'location': {'top': top, 'right': right, 'bottom': bottom, 'left': left},
+                'recognized': face['match'],
+                'confidence': face['confidence'],
+                'user': None,
+                'already_recorded': False,
+                'attendance': None,
+                'emotion': None
+            }
+            
+            if face['match']:
+                user_id = face['user']['user_id']
+                result['user'] = {'nama': face['user']['nama'], 'nim': face['user']['nim']}
+                
+                if best_face[user_id] != index:
+                    # Wajah yang sama di frame lain, dicatat lewat wajah terbaik
+                    result['duplicate_of'] = best_face[user_id]
+                elif user_id in today_attendance:
+                    result['already_recorded'] = True
+                    last = today_attendance[user_id]
+                    result['last_attendance'] = last.isoformat() if isinstance(last, datetime) else str(last)
+                else:
+                    attendance_record = recorded[index]
+                    result['attendance'] = {
+                        'id': attendance_record['id'],
+                        'timestamp': attendance_record['timestamp'].isoformat() if isinstance(attendance_record['timestamp'], datetime) else str(attendance_record['timestamp']),
+                        'confidence': face['confidence'],
+                        'status': attendance_record['status']
+                    }
+                    if not Config.EMOTION_DEFERRED:
+                        result['emotion'] = build_emotion_response(*emotions[index])
+            
+            results.append(result)
+        
+        return jsonify({
+            'faces': results,
+            'frame_errors': frame_errors,
+            'summary': {
+                'frames': len(images),
+                'faces': len(faces),
+                'recognized': sum(1 for face in faces if face['match']),
+                'recorded': len(records),
+                'already_recorded': len([uid for uid in best_face if uid in today_attendance])
+            },
+            'mood_pending': mood_pending,
+            'notification': {
+                'queued': n8n_webhook.is_async()
+            }
+        }), 201 if records else 200
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Batch attendance check error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/attendance/<int:attendance_id>/mood', methods=['GET'])
+def get_attendance_mood(attendance_id):
+    """Poll hasil deferred emotion detection untuk satu attendance"""
+    try:
+        with get_db() as db:
+            record = AttendanceModel(db).get_attendance_mood(attendance_id)
+        
+        if not record:
+            return jsonify({'error': 'Attendance tidak ditemukan'}), 404
+        
+        if record['mood'] is None:
+            return jsonify({
+                'attendance_id': attendance_id,
+                'pending': True,
+                'emotion': None
+            }), 200
+        
+        return jsonify({
+            'attendance_id': attendance_id,
+            'pending': False,
+            'emotion': build_emotion_response(
+                record['mood'],
+                record['mood_confidence'] or 0.0,
+                record['mood_emoji'],
+                emotion_detector.emotion_indonesian.get(record['mood'], record['mood'])
+            )
+        }), 200
+        
+    except Exception as e:
+        print(f"Get mood error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ============= UTILITY ROUTES =============
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
     try:
-        db = get_db()
-        db.close()
+        with get_db() as db:
+            db.execute_query("SELECT 1", fetch=True)
         return jsonify({
             'status': 'healthy',
             'database': 'connected',
+            'db_pool': get_pool().get_stats(),
             'timestamp': datetime.now().isoformat()
         })
     except:
@@ -254,17 +565,30 @@ def health_check():
             'database': 'disconnected'
         }), 500
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    """Readiness: 200 jika warm-up model selesai (atau dinonaktifkan), 503 selama loading"""
+    # Runner yang tidak memanggil start_warmup (misalnya flask run): probe pertama memulainya
+    start_warmup()
+    
+    status = warmup.get_status()
+    if not Config.STARTUP_WARMUP:
+        status['state'] = 'disabled'
+    
+    ready = status['state'] in ('ready', 'disabled')
+    return jsonify({
+        'ready': ready,
+        'warmup': status,
+        'timings': get_timings()
+    }), 200 if ready else 503
+
 @app.route('/api/users', methods=['GET'])
 def get_users():
     """Get all registered users"""
     try:
-        db = get_db()
-        user_model = UserModel(db)
-        
-        query = "SELECT id, nama, nim, created_at FROM users ORDER BY created_at DESC"
-        users = db.execute_query(query, fetch=True)
-        
-        db.close()
+        with get_db() as db:
+            query = "SELECT id, nama, nim, created_at FROM users ORDER BY created_at DESC"
+            users = db.execute_query(query, fetch=True)
         
         return jsonify({'users': users})
     except Exception as e:
@@ -274,18 +598,20 @@ def get_users():
 def delete_user(user_id):
     """Delete user by ID"""
     try:
-        db = get_db()
-        user_model = UserModel(db)
-        
-        user = user_model.get_user_by_id(user_id)
-        
-        if not user:
-            db.close()
-            return jsonify({'error': 'User tidak ditemukan'}), 404
-        
-        deleted = user_model.delete_user(user_id)
-        
-        db.close()
+        with get_db() as db:
+            user_model = UserModel(db)
+            
+            user = user_model.get_user_by_id(user_id)
+            
+            if not user:
+                return jsonify({'error': 'User tidak ditemukan'}), 404
+            
+            # Delete + generation bump dalam satu transaksi
+            deleted, generation = user_model.delete_user(user_id)
+            
+            if deleted:
+                encoding_cache.remove_user(user_id, generation)
+                checkin_cache.discard(user_id)
         
         if deleted:
             return jsonify({
@@ -304,5 +630,40 @@ def delete_user(user_id):
         print(f"Delete user error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Runtime statistics untuk sizing (connection pool, gallery, webhook queue, mood worker, check-in cache/batcher)"""
+    return jsonify({
+        'db_pool': get_pool().get_stats(),
+        'encoding_cache': encoding_cache.get_stats(),
+        'checkin_cache': checkin_cache.get_stats(),
+        'checkin_batcher': checkin_batcher.get_stats(),
+        'webhook': n8n_webhook.get_stats(),
+        'mood_worker': mood_worker.get_stats()
+    })
+
 if __name__ == '__main__':
+    # DEBUG=True menjalankan reloader Werkzeug: block ini juga dijalankan oleh
+    # process watcher (parent) yang tidak melayani request. Worker background
+    # hanya boleh jalan di process yang serving (WERKZEUG_RUN_MAIN di child)
+    serving_process = not Config.DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    
+    if serving_process:
+        print(Config.get_config_summary())
+        validate_face_profiles()
+        
+        # Model di-load di background, /api/health langsung bisa dipakai
+        start_warmup()
+        
+        # Preload encoding cache sekali saat startup
+        try:
+            with timed('startup:encoding_cache'), get_db() as db:
+                encoding_cache.load(db)
+        except Exception as e:
+            print(f"⚠️ Encoding cache preload failed (will load on first request): {e}")
+        
+        # Kirim ulang notifikasi yang tertinggal di spool dari run sebelumnya
+        # (satu worker per spool: parent reloader tidak boleh ikut replay/compact)
+        n8n_webhook.start()
+    
     app.run(debug=Config.DEBUG, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,316 @@
+"""
+Mode serving async (ASGI) untuk attendance API
+Jalankan: uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+- Route hot path kiosk (check-in, poll mood, health) berjalan di event loop:
+  I/O database lewat asyncpg, sehingga ratusan kiosk tidak butuh satu thread per koneksi
+- Bagian CPU-bound (decode + deteksi + encoding) dikirim ke executor khusus
+  (ASGI_CPU_EXECUTOR), emotion detection ke executor sendiri (EMOTION_WORKERS)
+- Route lain (register, users, stats, check-batch, ...) diteruskan ke Flask app
+  yang sama lewat WSGI bridge, jadi kontrak semua route tidak berubah
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from functools import partial
+from a2wsgi import WSGIMiddleware
+from quart import Quart, request, jsonify
+from quart_cors import cors
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from config import Config
+from async_models import create_async_pool, get_async_pool_stats, AsyncFaceEncodingModel, AsyncAttendanceModel
+from utils.face_recognition import validate_face_profiles, get_process_pool, _reset_process_pool, _prepare_checkin_in_worker
+from app import (
+    app as flask_app, face_handler, n8n_webhook, emotion_detector, encoding_cache,
+    checkin_cache, mood_worker, get_db, build_emotion_response, start_warmup
+)
+from utils.startup import timed
+
+quart_app = Quart(__name__, static_folder=None)
+quart_app = cors(quart_app, allow_origin='*')
+quart_app.config.from_object(Config)
+
+# Diisi saat startup (before_serving)
+db_pool = None
+
+# Thread executor: dipakai jika ASGI_CPU_EXECUTOR='thread' atau process pool rusak
+cpu_thread_executor = ThreadPoolExecutor(max_workers=Config.MAX_WORKERS, thread_name_prefix='asgi-cpu')
+emotion_executor = ThreadPoolExecutor(max_workers=Config.EMOTION_WORKERS, thread_name_prefix='asgi-emotion')
+
+async def prepare_checkin(image_data):
+    """decode + quality + detect + encode di executor CPU -> (image, encoding, face_location, error)"""
+    loop = asyncio.get_running_loop()
+    
+    if Config.ASGI_CPU_EXECUTOR == 'process':
+        try:
+            return await loop.run_in_executor(get_process_pool(), _prepare_checkin_in_worker, (image_data,))
+        except BrokenProcessPool as e:
+            print(f"⚠️ Process pool broken, fallback ke thread executor: {e}")
+            _reset_process_pool()
+    
+    return await loop.run_in_executor(cpu_thread_executor, face_handler.prepare_checkin, image_data)
+
+def match_face(generation, face_encoding):
+    """Gallery (reload hanya jika generation berubah) + compare. Dijalankan di thread"""
+    gallery = encoding_cache.get_gallery_at(generation, get_db)
+    if len(gallery) == 0:
+        return None
+    return face_handler.compare_faces(gallery, face_encoding)
+
+@quart_app.errorhandler(RequestEntityTooLarge)
+async def request_too_large(e):
+    """Sama dengan app.request_too_large"""
+    return jsonify({'error': f'Request terlalu besar (maksimal {Config.MAX_CONTENT_LENGTH // (1024 * 1024)} MB)'}), 413
+
+async def read_request_images():
+    """Versi async dari app.read_request_images, format request sama"""
+    mimetype = request.mimetype or ''
+    
+    if mimetype == 'multipart/form-data':
+        files = await request.files
+        form = await request.form
+        files = files.getlist('images') + files.getlist('image')
+        return [f.read() for f in files], form.to_dict()
+    
+    if mimetype.startswith('image/') or mimetype == 'application/octet-stream':
+        # Body dibaca bertahap tanpa memblokir event loop (dibatasi MAX_CONTENT_LENGTH)
+        buffer = bytearray()
+        async for chunk in request.body:
+            buffer.extend(chunk)
+        return ([bytes(buffer)] if buffer else []), request.args.to_dict()
+    
+    data = await request.get_json(silent=True) or {}
+    images = data.get('images')
+    if images is None:
+        images = [data['image']] if data.get('image') else []
+    return images, data
+
+@quart_app.before_serving
+async def startup():
+    global db_pool
+    print(Config.get_config_summary())
+    validate_face_profiles()
+    
+    # Model di-load di background, status di /api/ready
+    start_warmup()
+    
+    with timed('startup:async_db_pool'):
+        db_pool = await create_async_pool()
+    
+    # Preload encoding cache sekali saat startup
+    loop = asyncio.get_running_loop()
+    try:
+        with timed('startup:encoding_cache'):
+            async with db_pool.acquire() as conn:
+                generation = await AsyncFaceEncodingModel(conn).get_generation()
+            await loop.run_in_executor(None, encoding_cache.get_gallery_at, generation, get_db)
+    except Exception as e:
+        print(f"⚠️ Encoding cache preload failed (will load on first request): {e}")
+    
+    # Kirim ulang notifikasi yang tertinggal di spool dari run sebelumnya
+    n8n_webhook.start()
+
+@quart_app.after_serving
+async def shutdown():
+    if db_pool is not None:
+        await db_pool.close()
+    cpu_thread_executor.shutdown(wait=False, cancel_futures=True)
+    emotion_executor.shutdown(wait=False, cancel_futures=True)
+
+@quart_app.route('/api/attendance/check', methods=['POST'])
+async def check_attendance():
+    """Check attendance using face recognition + emotion detection (kontrak sama dengan app.py)"""
+    try:
+        images, _ = await read_request_images()
+        
+        if not images:
+            return jsonify({'error': 'Image is required'}), 400
+        
+        img_array, face_encoding, face_location, error = await prepare_checkin(images[0])
+        
+        if error:
+            return jsonify({'error': error}), 400
+        
+        loop = asyncio.get_running_loop()
+        
+        async with db_pool.acquire(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            generation = await AsyncFaceEncodingModel(conn).get_generation()
+        
+        result = await loop.run_in_executor(None, match_face, generation, face_encoding)
+        
+        if result is None:
+            return jsonify({'error': 'Belum ada data wajah terdaftar'}), 404
+        
+        match, user_data, confidence = result
+        
+        # Emotion detection di-skip jika wajah tidak dikenali
+        if not match:
+            return jsonify({
+                'recognized': False,
+                'message': 'Wajah tidak dikenali',
+                'confidence': float(confidence),
+                'emotion': None
+            }), 200
+        
+        # Check if already recorded today (cache per-process dulu, lalu index lookup)
+        last_attendance = checkin_cache.get(user_data['user_id'])
+        if last_attendance is None:
+            async with db_pool.acquire(timeout=Config.DB_POOL_TIMEOUT) as conn:
+                last_attendance = await AsyncAttendanceModel(conn).get_last_attendance_today(user_data['user_id'])
+            if last_attendance is not None:
+                checkin_cache.mark(user_data['user_id'], last_attendance)
+        
+        # Emotion detection di-skip jika sudah absen hari ini
+        if last_attendance is not None:
+            return jsonify({
+                'recognized': True,
+                'already_recorded': True,
+                'message': f"{user_data['nama']} sudah absen hari ini",
+                'user': {
+                    'nama': user_data['nama'],
+                    'nim': user_data['nim']
+                },
+                'last_attendance': last_attendance.isoformat() if isinstance(last_attendance, datetime) else str(last_attendance),
+                'emotion': None
+            }), 200
+        
+        if Config.EMOTION_DEFERRED:
+            # Mood dianalisis di background, response tidak menunggu
+            emotion = emotion_confidence = emoji = None
+            emotion_response = None
+        else:
+            # Detect emotion pada ROI wajah di executor emotion (event loop tetap bebas)
+            emotion, emotion_confidence, emoji, emotion_indonesian = await loop.run_in_executor(
+                emotion_executor,
+                partial(emotion_detector.detect_emotion, img_array, face_location=face_location)
+            )
+            emotion_confidence = float(emotion_confidence)
+            emotion_response = build_emotion_response(emotion, emotion_confidence, emoji, emotion_indonesian)
+        
+        # Record attendance WITH MOOD (NULL jika deferred)
+        async with db_pool.acquire(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            attendance_record = await AsyncAttendanceModel(conn).record_attendance(
+                user_data['user_id'],
+                float(confidence),
+                'hadir',
+                emotion,
+                emotion_confidence,
+                emoji
+            )
+        checkin_cache.mark(user_data['user_id'], attendance_record['timestamp'])
+        
+        mood_pending = Config.EMOTION_DEFERRED and mood_worker.submit(
+            attendance_record['id'], img_array, face_location
+        )
+        
+        # Webhook sync (WEBHOOK_ASYNC=False) melakukan HTTP request -> jangan di event loop
+        n8n_success, n8n_message = await loop.run_in_executor(
+            None, n8n_webhook.send_attendance_notification, user_data, attendance_record
+        )
+        
+        return jsonify({
+            'recognized': True,
+            'already_recorded': False,
+            'message': f"Absensi berhasil dicatat untuk {user_data['nama']}",
+            'user': {
+                'nama': user_data['nama'],
+                'nim': user_data['nim']
+            },
+            'attendance': {
+                'id': attendance_record['id'],
+                'timestamp': attendance_record['timestamp'].isoformat() if isinstance(attendance_record['timestamp'], datetime) else str(attendance_record['timestamp']),
+                'confidence': float(confidence),
+                'status': attendance_record['status']
+            },
+            'emotion': emotion_response,
+            'mood_pending': mood_pending,
+            'notification': {
+                'sent': n8n_success,
+                'queued': n8n_webhook.is_async(),
+                'message': n8n_message
+            }
+        }), 201
+    
+    except HTTPException:
+        # 413 (MAX_CONTENT_LENGTH) / 400 dari parsing upload, bukan 500
+        raise
+    except Exception as e:
+        print(f"Attendance check error: {e}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+
+@quart_app.route('/api/attendance/<int:attendance_id>/mood', methods=['GET'])
+async def get_attendance_mood(attendance_id):
+    """Poll hasil deferred emotion detection untuk satu attendance"""
+    try:
+        async with db_pool.acquire(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            record = await AsyncAttendanceModel(conn).get_attendance_mood(attendance_id)
+        
+        if not record:
+            return jsonify({'error': 'Attendance tidak ditemukan'}), 404
+        
+        if record['mood'] is None:
+            return jsonify({
+                'attendance_id': attendance_id,
+                'pending': True,
+                'emotion': None
+            }), 200
+        
+        return jsonify({
+            'attendance_id': attendance_id,
+            'pending': False,
+            'emotion': build_emotion_response(
+                record['mood'],
+                record['mood_confidence'] or 0.0,
+                record['mood_emoji'],
+                emotion_detector.emotion_indonesian.get(record['mood'], record['mood'])
+            )
+        }), 200
+    
+    except Exception as e:
+        print(f"Get mood error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@quart_app.route('/api/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    try:
+        async with db_pool.acquire(timeout=Config.DB_POOL_TIMEOUT) as conn:
+            await conn.fetchval("SELECT 1")
+        return jsonify({
+            'status': 'healthy',
+            'database': 'connected',
+            'db_pool': get_async_pool_stats(db_pool),
+            'timestamp': datetime.now().isoformat()
+        })
+    except Exception:
+        return jsonify({
+            'status': 'unhealthy',
+            'database': 'disconnected'
+        }), 500
+
+# Route Flask (sync) dijalankan di thread pool WSGI bridge
+wsgi_app = WSGIMiddleware(flask_app, workers=Config.ASGI_WSGI_THREADS)
+
+def is_async_route(scope):
+    """True jika path + method dilayani route async di quart_app"""
+    adapter = quart_app.url_map.bind('')
+    try:
+        adapter.match(scope['path'], method=scope.get('method', 'GET'))
+        return True
+    except HTTPException:
+        return False
+
+async def app(scope, receive, send):
+    """Entry point ASGI: lifespan + route async ke Quart, sisanya ke Flask"""
+    if scope['type'] == 'lifespan' or (scope['type'] == 'http' and is_async_route(scope)):
+        await quart_app(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,80 @@
+"""
+Query async (asyncpg) untuk hot path check-in di mode ASGI
+Query sama dengan models.py (placeholder $n), hanya yang dipakai per request kiosk.
+Route lain tetap memakai models.py lewat Flask
+"""
+
+import asyncpg
+from datetime import datetime
+from config import Config
+from models import AttendanceModel
+
+async def create_async_pool():
+    """Pool asyncpg per process, ukuran mengikuti DB_POOL_MIN_CONN / DB_POOL_MAX_CONN"""
+    return await asyncpg.create_pool(
+        host=Config.DB_HOST,
+        port=int(Config.DB_PORT),
+        database=Config.DB_NAME,
+        user=Config.DB_USER,
+        password=Config.DB_PASSWORD,
+        min_size=Config.DB_POOL_MIN_CONN,
+        max_size=Config.DB_POOL_MAX_CONN
+    )
+
+def get_async_pool_stats(pool):
+    return {
+        'size': pool.get_size(),
+        'idle': pool.get_idle_size(),
+        'min': pool.get_min_size(),
+        'max': pool.get_max_size()
+    }
+
+class AsyncFaceEncodingModel:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    async def get_generation(self):
+        """Generation gallery saat ini (satu row, dibandingkan dengan EncodingCache)"""
+        generation = await self.conn.fetchval("SELECT generation FROM gallery_version WHERE id = 1")
+        return generation or 0
+
+class AsyncAttendanceModel:
+    def __init__(self, conn):
+        self.conn = conn
+    
+    async def record_attendance(self, user_id, confidence_score, status='hadir', mood=None, mood_confidence=None, mood_emoji=None):
+        """Record attendance with mood tracking (sama dengan AttendanceModel.record_attendance)"""
+        confidence_score = float(confidence_score)
+        if mood_confidence is not None:
+            mood_confidence = float(mood_confidence)
+        
+        query = """
+            INSERT INTO attendance (user_id, confidence_score, status, timestamp, mood, mood_confidence, mood_emoji)
+            VALUES ($1, $2, $3, $4, $5, $6, $7)
+            RETURNING id, user_id, timestamp, confidence_score, status, mood, mood_confidence, mood_emoji
+        """
+        row = await self.conn.fetchrow(
+            query,
+            user_id, confidence_score, status, datetime.now(), mood, mood_confidence, mood_emoji
+        )
+        return dict(row) if row else None
+    
+    async def get_last_attendance_today(self, user_id):
+        """Timestamp absen terakhir hari ini, None jika belum absen (index-only scan, LIMIT 1)"""
+        query = """
+            SELECT timestamp FROM attendance
+            WHERE user_id = $1
+            AND timestamp >= $2 AND timestamp < $3
+            ORDER BY timestamp DESC
+            LIMIT 1
+        """
+        return await self.conn.fetchval(query, user_id, *AttendanceModel.today_range())
+    
+    async def get_attendance_mood(self, attendance_id):
+        query = """
+            SELECT id, mood, mood_confidence, mood_emoji
+            FROM attendance
+            WHERE id = $1
+        """
+        row = await self.conn.fetchrow(query, attendance_id)
+        return dict(row) if row else None
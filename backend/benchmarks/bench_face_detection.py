@@ -0,0 +1,100 @@
+"""
+Benchmark deteksi wajah: resolusi penuh vs salinan kecil (FACE_DETECTION_MAX_SIZE)
+
+Fixture: folder berisi foto webcam (jpg/png), tidak ikut di-commit.
+Untuk setiap ukuran deteksi dilaporkan latency per frame, detection rate, dan
+IoU box terbesar terhadap deteksi resolusi penuh.
+
+Usage (dari folder backend):
+    python benchmarks/bench_face_detection.py path/to/fixtures --sizes 0 480 400 320
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from utils.face_recognition import FaceRecognitionHandler
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png')
+
+
+def load_fixtures(folder, handler):
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(folder, pattern)))
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            image = handler.bytes_to_image(f.read())
+        if image is not None:
+            images.append((os.path.basename(path), image))
+    return images
+
+
+def iou(a, b):
+    top, right = max(a[0], b[0]), min(a[1], b[1])
+    bottom, left = min(a[2], b[2]), max(a[3], b[3])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    union = area(a) + area(b) - inter
+    return inter / union if union else 0.0
+
+
+def run(handler, images, profile, max_size, fallback):
+    boxes = []
+    start = time.perf_counter()
+    for _, image in images:
+        locations, error = handler.detect_faces(image, profile, max_size=max_size, fallback=fallback)
+        boxes.append(None if error else locations[0])
+    elapsed = time.perf_counter() - start
+    return boxes, elapsed * 1000 / len(images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('fixtures', help='folder berisi foto wajah')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 480, 400, 320],
+                        help='FACE_DETECTION_MAX_SIZE yang diuji (0 = resolusi penuh)')
+    parser.add_argument('--fallback', default=Config.FACE_DETECTION_FALLBACK, choices=['clahe', 'full', 'none'])
+    parser.add_argument('--profile', default='checkin', choices=['checkin', 'enroll'])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    handler = FaceRecognitionHandler()
+    profile = Config.get_face_profile(args.profile)
+    images = load_fixtures(args.fixtures, handler)
+
+    if not images:
+        print(f"Tidak ada gambar di {args.fixtures}")
+        return
+
+    print(f"{len(images)} fixtures, profile {profile['name']} ({profile['detection_model']}, "
+          f"upsample {profile['upsample']}), fallback {args.fallback}, "
+          f"decoded at <= {Config.MAX_IMAGE_SIZE}px")
+
+    # Referensi: resolusi penuh
+    reference, _ = run(handler, images, profile, 0, args.fallback)
+
+    for size in args.sizes:
+        timings = []
+        for _ in range(args.repeat):
+            boxes, ms = run(handler, images, profile, size, args.fallback)
+            timings.append(ms)
+
+        detected = sum(box is not None for box in boxes)
+        overlaps = [iou(box, ref) for box, ref in zip(boxes, reference) if box is not None and ref is not None]
+        mean_iou = sum(overlaps) / len(overlaps) if overlaps else 0.0
+        missed = [name for (name, _), box, ref in zip(images, boxes, reference) if box is None and ref is not None]
+
+        label = 'full' if size == 0 else f'{size}px'
+        print(f"{label:>8}  {min(timings):8.2f} ms/frame  detection rate {detected / len(images) * 100:6.2f}%  "
+              f"IoU vs full {mean_iou:.3f}")
+        for name in missed:
+            print(f"          missed (found at full res): {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark recall vs latency: IVF index / centroid prefilter vs exact brute-force scan
+
+Data sintetis meniru encoding dlib (128-d, jarak antar user ~1.0,
+jarak dalam satu user ~0.3-0.4). Top-1 IVF dibandingkan dengan scan exact.
+Centroid prefilter juga diukur untuk wajah tidak terdaftar (--unknown).
+
+Usage (dari folder backend):
+    python benchmarks/bench_face_index.py --users 20000 --per-user 8 --nprobe 8 --top-k 20
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.face_gallery import FaceGallery
+from utils.face_index import BruteForceIndex, IVFIndex
+
+
+def make_records(num_users, per_user, rng):
+    centers = rng.normal(0, 1.0 / np.sqrt(2 * 128), (num_users, 128)) * 1.0
+    records = []
+    for user_id in range(num_users):
+        noise = rng.normal(0, 0.25 / np.sqrt(128), (per_user, 128))
+        for encoding in centers[user_id] + noise:
+            records.append({
+                'user_id': user_id,
+                'nama': f'user-{user_id}',
+                'nim': str(user_id),
+                'encoding': encoding
+            })
+    return centers, records
+
+
+def decision_agreement(approx, exact, tolerance):
+    """% query dengan keputusan match (distance <= tolerance) + user yang sama dengan exact"""
+    return sum(
+        (a[0] == e[0] or e[1] > tolerance) and ((a[1] <= tolerance) == (e[1] <= tolerance))
+        for a, e in zip(approx, exact)
+    ) / len(exact) * 100
+
+
+def run(gallery, queries):
+    results = []
+    start = time.perf_counter()
+    for query in queries:
+        user, combined, *_ = gallery.best_match(query)
+        results.append((user['user_id'], combined))
+    elapsed = time.perf_counter() - start
+    return results, elapsed * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--per-user', type=int, default=8)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--unknown', type=int, default=200, help='query wajah tidak terdaftar')
+    parser.add_argument('--nlist', type=int, default=0)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--top-k', type=int, default=20, help='centroid prefilter shortlist (0 = skip)')
+    parser.add_argument('--tolerance', type=float, default=0.55)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers, records = make_records(args.users, args.per_user, rng)
+
+    # Query: encoding baru dari user acak
+    query_users = rng.integers(0, args.users, args.queries)
+    queries = centers[query_users] + rng.normal(0, 0.25 / np.sqrt(128), (args.queries, 128))
+
+    # Wajah tidak terdaftar: center baru dari distribusi yang sama
+    unknown = make_records(args.unknown, 1, rng)[0]
+
+    print(f"Gallery: {args.users} users x {args.per_user} encodings = {len(records)} rows")
+
+    exact_gallery = FaceGallery.from_records(records, index=BruteForceIndex(), prefilter_top_k=0)
+    exact, exact_ms = run(exact_gallery, queries)
+    exact_unknown, exact_unknown_ms = run(exact_gallery, unknown)
+    print(f"{'brute':>12}  {exact_ms:8.3f} ms/query  top-1 agreement 100.00%  "
+          f"(unknown {exact_unknown_ms:.3f} ms/query)")
+
+    if args.top_k:
+        prefilter_gallery = FaceGallery.from_records(records, index=BruteForceIndex(), prefilter_top_k=args.top_k)
+        prefiltered, prefilter_ms = run(prefilter_gallery, queries)
+        prefiltered_unknown, prefilter_unknown_ms = run(prefilter_gallery, unknown)
+        agree = sum(p[0] == e[0] for p, e in zip(prefiltered, exact)) / len(exact) * 100
+        decision = decision_agreement(prefiltered + prefiltered_unknown, exact + exact_unknown, args.tolerance)
+        print(f"{'centroid/' + str(args.top_k):>12}  {prefilter_ms:8.3f} ms/query  top-1 agreement {agree:6.2f}%  "
+              f"decision agreement {decision:6.2f}%  (unknown {prefilter_unknown_ms:.3f} ms/query)")
+
+    for nprobe in args.nprobe:
+        start = time.perf_counter()
+        ivf_gallery = FaceGallery.from_records(records, index=IVFIndex(nlist=args.nlist, nprobe=nprobe),
+                                               prefilter_top_k=0)
+        build_s = time.perf_counter() - start
+
+        approx, approx_ms = run(ivf_gallery, queries)
+
+        agree = sum(a[0] == e[0] for a, e in zip(approx, exact)) / len(exact) * 100
+        # Keputusan match (distance <= tolerance) harus sama
+        decision = decision_agreement(approx, exact, args.tolerance)
+
+        print(f"{'ivf/' + str(nprobe):>12}  {approx_ms:8.3f} ms/query  top-1 agreement {agree:6.2f}%  "
+              f"decision agreement {decision:6.2f}%  (build {build_s:.1f}s, "
+              f"nlist {len(ivf_gallery.index.lists)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -11,6 +11,14 @@ class Config:
     DB_USER = os.getenv('DB_USER', 'postgres')
     DB_PASSWORD = os.getenv('DB_PASSWORD', 'postgres')
     
+    # NEW: Connection pool
+    DB_POOL_MIN_CONN = int(os.getenv('DB_POOL_MIN_CONN', '1'))
+    DB_POOL_MAX_CONN = int(os.getenv('DB_POOL_MAX_CONN', '10'))
+    # Max waktu tunggu koneksi jika pool penuh (seconds)
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))
+    # Koneksi idle lebih lama dari ini divalidasi (SELECT 1) sebelum dipakai (seconds)
+    DB_POOL_VALIDATE_IDLE = float(os.getenv('DB_POOL_VALIDATE_IDLE', '30'))
+    
     # Face Recognition Configuration
     # CHANGED: Tolerance sedikit lebih tinggi karena menggunakan minimum distance
     FACE_RECOGNITION_TOLERANCE = float(os.getenv('FACE_RECOGNITION_TOLERANCE', '0.45'))  # Was 0.6
@@ -18,16 +26,85 @@ class Config:
     # CHANGED: Reduced dari 10 ke 5 untuk registrasi lebih cepat
     MIN_FACE_ENCODINGS = int(os.getenv('MIN_FACE_ENCODINGS', '5'))  # Was 10
     
+    # NEW: Registrasi: wajah hampir identik (dhash crop wajah) tidak di-encode selama masih
+    # ada frame lain, encoding berhenti setelah REGISTRATION_MAX_ENCODINGS encoding berbeda.
+    # Jumlah encoding tersimpan = min(frame valid, REGISTRATION_MAX_ENCODINGS), sama dengan
+    # "top 10 tertajam" sebelumnya; dedup hanya mengubah frame mana yang dipilih
+    REGISTRATION_MAX_ENCODINGS = int(os.getenv('REGISTRATION_MAX_ENCODINGS', '10'))
+    REGISTRATION_DEDUP_HAMMING = int(os.getenv('REGISTRATION_DEDUP_HAMMING', '4'))  # bit dari 64
+    REGISTRATION_MIN_ENCODING_DISTANCE = float(os.getenv('REGISTRATION_MIN_ENCODING_DISTANCE', '0.05'))
+    
     # NEW: Face encoding optimization
     # num_jitters untuk face encoding (1=fast, 5=accurate, 10=very accurate but slow)
     FACE_NUM_JITTERS = int(os.getenv('FACE_NUM_JITTERS', '1'))  # 1 = 5x faster
     
     # NEW: Face detection model ('hog'=fast, 'cnn'=accurate but needs GPU)
     FACE_DETECTION_MODEL = os.getenv('FACE_DETECTION_MODEL', 'hog')  # hog = 10x faster
+    # Berapa kali gambar di-upsample sebelum deteksi (lebih tinggi = wajah kecil terdeteksi, lebih lambat)
+    FACE_DETECTION_UPSAMPLE = int(os.getenv('FACE_DETECTION_UPSAMPLE', '1'))
+    
+    # NEW: Deteksi dijalankan pada salinan kecil (sisi terpanjang <= nilai ini), box di-scale
+    # kembali ke resolusi penuh untuk landmark + encoding. 0 = deteksi pada resolusi penuh
+    FACE_DETECTION_MAX_SIZE = int(os.getenv('FACE_DETECTION_MAX_SIZE', '400'))
+    # Jika tidak ada wajah: 'clahe' = ulang pada salinan kecil yang di-enhance,
+    # 'full' = clahe lalu ulang pada resolusi penuh (wajah kecil/jauh), 'none' = langsung gagal
+    FACE_DETECTION_FALLBACK = os.getenv('FACE_DETECTION_FALLBACK', 'clahe').lower()
+    
+    # NEW: Profile detection/encoding terpisah untuk registrasi dan check-in
+    # Nilai: nama preset di FACE_PROFILES, atau 'custom' = FACE_DETECTION_MODEL,
+    # FACE_DETECTION_UPSAMPLE dan FACE_NUM_JITTERS di atas
+    FACE_PROFILES = {
+        'fast': {'detection_model': 'hog', 'upsample': 1, 'num_jitters': 1},
+        'balanced': {'detection_model': 'hog', 'upsample': 1, 'num_jitters': 3},
+        'accurate': {'detection_model': 'cnn', 'upsample': 1, 'num_jitters': 5},
+    }
+    FACE_PROFILE_ENROLL = os.getenv('FACE_PROFILE_ENROLL', 'balanced').lower()
+    FACE_PROFILE_CHECKIN = os.getenv('FACE_PROFILE_CHECKIN', 'custom').lower()
+    
+    # NEW: Encoding lama (pickle) masih dibaca sampai migrasi selesai
+    # Set False setelah menjalankan database/migrations/002_encodings_float32.py
+    ALLOW_LEGACY_PICKLE_ENCODINGS = os.getenv('ALLOW_LEGACY_PICKLE_ENCODINGS', 'True').lower() == 'true'
+    
+    # NEW: Matching index ('brute' = exact scan, 'ivf' = k-means partitioned, untuk enrollment besar)
+    FACE_INDEX_TYPE = os.getenv('FACE_INDEX_TYPE', 'brute')
+    FACE_INDEX_NLIST = int(os.getenv('FACE_INDEX_NLIST', '0'))  # jumlah partisi IVF (0 = sqrt(N))
+    FACE_INDEX_NPROBE = int(os.getenv('FACE_INDEX_NPROBE', '8'))  # partisi yang di-scan per query
+    
+    # NEW: Centroid prefilter: satu pass ke centroid tersimpan (tabel face_centroids), lalu
+    # full scoring min/avg/median hanya untuk N user dengan batas bawah (centroid - spread)
+    # terkecil. Aktif jika jumlah user > 2N. 0 = nonaktif (scan semua encoding)
+    FACE_PREFILTER_TOP_K = int(os.getenv('FACE_PREFILTER_TOP_K', '20'))
+    
+    # NEW: Batch check-in (/api/attendance/check-batch): maksimum frame per request
+    ATTENDANCE_BATCH_MAX_FRAMES = int(os.getenv('ATTENDANCE_BATCH_MAX_FRAMES', '10'))
+    
+    # NEW: Batas ukuran request (Flask MAX_CONTENT_LENGTH), berlaku untuk JSON dan upload
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_UPLOAD_MB', '32')) * 1024 * 1024
+    
+    # NEW: Micro-batching check-in: request /api/attendance/check yang datang hampir bersamaan
+    # di-encode + di-match dalam satu batch (satu forward pass dlib, satu GEMM, satu query)
+    CHECKIN_BATCH_ENABLED = os.getenv('CHECKIN_BATCH_ENABLED', 'False').lower() == 'true'
+    CHECKIN_BATCH_MAX_SIZE = int(os.getenv('CHECKIN_BATCH_MAX_SIZE', '16'))
+    CHECKIN_BATCH_MAX_WAIT_MS = float(os.getenv('CHECKIN_BATCH_MAX_WAIT_MS', '5'))
+    # Batas tunggu request untuk hasil batch; lewat dari ini -> 503
+    CHECKIN_BATCH_TIMEOUT = float(os.getenv('CHECKIN_BATCH_TIMEOUT', '10'))
     
     # NEW: Max image size for processing (auto-resize if larger)
+    # JPEG besar di-decode langsung pada resolusi lebih kecil (draft / IMREAD_REDUCED)
     MAX_IMAGE_SIZE = int(os.getenv('MAX_IMAGE_SIZE', '800'))  # pixels
     
+    # NEW: Quality check (validasi + ranking frame) dihitung sekali per frame pada grayscale
+    # resolusi asli. Threshold sharpness (variance Laplacian) berlaku pada resolusi ini
+    QUALITY_MIN_SIZE = int(os.getenv('QUALITY_MIN_SIZE', '100'))  # pixels, ukuran gambar asli
+    QUALITY_MIN_BRIGHTNESS = float(os.getenv('QUALITY_MIN_BRIGHTNESS', '15'))
+    QUALITY_MAX_BRIGHTNESS = float(os.getenv('QUALITY_MAX_BRIGHTNESS', '245'))
+    QUALITY_MIN_SHARPNESS = float(os.getenv('QUALITY_MIN_SHARPNESS', '50'))
+    
+    # NEW: Interpolasi resize ('lanczos', 'area', 'bilinear', 'nearest')
+    # Registrasi memakai IMAGE_RESIZE_INTERPOLATION, frame check-in memakai yang lebih murah
+    IMAGE_RESIZE_INTERPOLATION = os.getenv('IMAGE_RESIZE_INTERPOLATION', 'lanczos')
+    IMAGE_FAST_INTERPOLATION = os.getenv('IMAGE_FAST_INTERPOLATION', 'bilinear')
+    
     # Emotion Detection Configuration
     # CHANGED: Use simple detector by default (much faster)
     EMOTION_DETECTOR_TYPE = os.getenv('EMOTION_DETECTOR_TYPE', 'simple')  # 'simple' or 'deepface'
@@ -35,6 +112,19 @@ class Config:
     # CHANGED: Lower threshold untuk senyum tipis
     EMOTION_CONFIDENCE_THRESHOLD = float(os.getenv('EMOTION_CONFIDENCE_THRESHOLD', '25'))  # Was 40
     
+    # NEW: Emotion ensemble mode
+    # 'off' = 1 variasi (tercepat), 'light' = original + enhanced, 'full' = + brightened
+    # Semua variasi diklasifikasi dalam satu batched forward pass
+    EMOTION_ENSEMBLE_MODE = os.getenv('EMOTION_ENSEMBLE_MODE', 'full').lower()
+    
+    # NEW: Deferred emotion detection
+    # True = attendance dicatat dulu, mood diisi oleh background worker
+    # (poll via GET /api/attendance/<id>/mood)
+    EMOTION_DEFERRED = os.getenv('EMOTION_DEFERRED', 'False').lower() == 'true'
+    EMOTION_WORKERS = int(os.getenv('EMOTION_WORKERS', '1'))
+    # Maksimum job mood pending; saat penuh mood di-skip (tetap NULL). 0 = tanpa batas
+    EMOTION_QUEUE_SIZE = int(os.getenv('EMOTION_QUEUE_SIZE', '64'))
+    
     # NEW: Smile detection threshold for MAR (Mouth Aspect Ratio)
     SMILE_MAR_THRESHOLD = float(os.getenv('SMILE_MAR_THRESHOLD', '0.25'))  # Lower = more sensitive
     
@@ -47,6 +137,48 @@ class Config:
     # NEW: Webhook timeout (seconds)
     WEBHOOK_TIMEOUT = int(os.getenv('WEBHOOK_TIMEOUT', '15'))
     
+    # NEW: Async webhook delivery (antrian + background worker)
+    WEBHOOK_ASYNC = os.getenv('WEBHOOK_ASYNC', 'True').lower() == 'true'
+    WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+    WEBHOOK_MAX_RETRIES = int(os.getenv('WEBHOOK_MAX_RETRIES', '5'))
+    # Backoff retry: 1s, 2s, 4s, ... (max WEBHOOK_RETRY_BACKOFF_MAX)
+    WEBHOOK_RETRY_BACKOFF = float(os.getenv('WEBHOOK_RETRY_BACKOFF', '1.0'))
+    WEBHOOK_RETRY_BACKOFF_MAX = float(os.getenv('WEBHOOK_RETRY_BACKOFF_MAX', '60'))
+    # Spool file (JSONL) agar notifikasi yang belum terkirim tidak hilang saat restart
+    WEBHOOK_SPOOL_FILE = os.getenv(
+        'WEBHOOK_SPOOL_FILE',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'webhook_spool.jsonl')
+    )
+    
+    # NEW: Batch mode (butuh WEBHOOK_ASYNC): banyak event dalam satu POST (JSON array)
+    WEBHOOK_BATCH_ENABLED = os.getenv('WEBHOOK_BATCH_ENABLED', 'False').lower() == 'true'
+    WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '50'))  # flush jika sudah N event
+    WEBHOOK_BATCH_WINDOW = float(os.getenv('WEBHOOK_BATCH_WINDOW', '5'))  # flush setelah N detik
+    
+    # NEW: Warm-up model (dlib + FER) paralel di background saat startup, status di /api/ready
+    # False = model baru di-load saat request pertama yang membutuhkannya
+    STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', 'True').lower() == 'true'
+    
+    # NEW: Async serving mode (uvicorn asgi:app)
+    # Executor untuk bagian CPU-bound check-in: 'process' (process pool registrasi, MAX_WORKERS)
+    # atau 'thread' (tanpa overhead pickle, tetapi dlib memegang GIL)
+    ASGI_CPU_EXECUTOR = os.getenv('ASGI_CPU_EXECUTOR', 'process').lower()
+    # Thread untuk route sync (Flask) yang tidak punya versi async: register, users, stats, ...
+    ASGI_WSGI_THREADS = int(os.getenv('ASGI_WSGI_THREADS', '10'))
+    
+    # NEW: Pre-fork serving mode (gunicorn -c gunicorn.conf.py app:app)
+    WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:5000')
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', str(os.cpu_count() or 1)))
+    WEB_THREADS = int(os.getenv('WEB_THREADS', '4'))  # thread per worker (gthread)
+    WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '120'))
+    # Import app (model) sekali di master lalu fork (copy-on-write)
+    WEB_PRELOAD = os.getenv('WEB_PRELOAD', 'True').lower() == 'true'
+    
+    # Snapshot gallery dibagi antar worker lewat file .npy yang di-mmap (utils/shared_gallery.py)
+    GALLERY_SHARED_ENABLED = os.getenv('GALLERY_SHARED_ENABLED', 'False').lower() == 'true'
+    GALLERY_SHARED_DIR = os.getenv('GALLERY_SHARED_DIR', '')  # kosong = /dev/shm/face-gallery-<DB_NAME>
+    GALLERY_SHARED_KEEP = int(os.getenv('GALLERY_SHARED_KEEP', '3'))  # generation yang disimpan
+    
     # Flask Configuration
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.getenv('DEBUG', 'True').lower() == 'true'
@@ -55,7 +187,7 @@ class Config:
     # Enable parallel processing for face encoding
     ENABLE_PARALLEL_PROCESSING = os.getenv('ENABLE_PARALLEL_PROCESSING', 'True').lower() == 'true'
     
-    # Max worker threads for parallel processing
+    # Max worker processes for parallel processing (registrasi: decode + encode per frame)
     MAX_WORKERS = int(os.getenv('MAX_WORKERS', '4'))
     
     # NEW: Cache settings
@@ -70,6 +202,27 @@ class Config:
     def get_db_connection_string():
         return f"host={Config.DB_HOST} port={Config.DB_PORT} dbname={Config.DB_NAME} user={Config.DB_USER} password={Config.DB_PASSWORD}"
     
+    @staticmethod
+    def get_face_profile(stage):
+        """
+        Profile efektif untuk stage 'enroll' atau 'checkin'
+        Returns: dict {name, detection_model, upsample, num_jitters}
+        """
+        name = Config.FACE_PROFILE_ENROLL if stage == 'enroll' else Config.FACE_PROFILE_CHECKIN
+        
+        if name in Config.FACE_PROFILES:
+            return dict(Config.FACE_PROFILES[name], name=name)
+        
+        if name != 'custom':
+            print(f"⚠️ Unknown face profile '{name}' for {stage}, using 'custom'")
+        
+        return {
+            'name': 'custom',
+            'detection_model': Config.FACE_DETECTION_MODEL.lower(),
+            'upsample': Config.FACE_DETECTION_UPSAMPLE,
+            'num_jitters': Config.FACE_NUM_JITTERS
+        }
+    
     @staticmethod
     def get_config_summary():
         """Print current configuration for debugging"""
@@ -79,16 +232,27 @@ class Config:
 ║ Database:                                                     ║
 ║   Host: {Config.DB_HOST}:{Config.DB_PORT}                    
 ║   Database: {Config.DB_NAME}                                 
+║   Pool: {Config.DB_POOL_MIN_CONN}-{Config.DB_POOL_MAX_CONN} connections (timeout {Config.DB_POOL_TIMEOUT}s)
 ║                                                               ║
 ║ Face Recognition:                                             ║
 ║   Tolerance: {Config.FACE_RECOGNITION_TOLERANCE}             
-║   Min Encodings: {Config.MIN_FACE_ENCODINGS}                 
+║   Min Encodings: {Config.MIN_FACE_ENCODINGS} (max {Config.REGISTRATION_MAX_ENCODINGS}, dedup {Config.REGISTRATION_DEDUP_HAMMING} bits)
+║   Enroll Profile: {Config.FACE_PROFILE_ENROLL}               
+║   Check-in Profile: {Config.FACE_PROFILE_CHECKIN}            
 ║   Num Jitters: {Config.FACE_NUM_JITTERS}                     
-║   Detection Model: {Config.FACE_DETECTION_MODEL}             
-║   Max Image Size: {Config.MAX_IMAGE_SIZE}px                  
+║   Detection Model: {Config.FACE_DETECTION_MODEL} (upsample {Config.FACE_DETECTION_UPSAMPLE})
+║   Detection Size: {Config.FACE_DETECTION_MAX_SIZE}px (fallback {Config.FACE_DETECTION_FALLBACK})
+║   Index: {Config.FACE_INDEX_TYPE} (nlist {Config.FACE_INDEX_NLIST}, nprobe {Config.FACE_INDEX_NPROBE})
+║   Centroid Prefilter Top-K: {Config.FACE_PREFILTER_TOP_K}    
+║   Batch Check-in: max {Config.ATTENDANCE_BATCH_MAX_FRAMES} frames
+║   Check-in Micro-batching: {Config.CHECKIN_BATCH_ENABLED} (max {Config.CHECKIN_BATCH_MAX_SIZE}, wait {Config.CHECKIN_BATCH_MAX_WAIT_MS}ms, timeout {Config.CHECKIN_BATCH_TIMEOUT}s)
+║   Quality Check: min sharpness {Config.QUALITY_MIN_SHARPNESS}, brightness {Config.QUALITY_MIN_BRIGHTNESS}-{Config.QUALITY_MAX_BRIGHTNESS}
+║   Max Image Size: {Config.MAX_IMAGE_SIZE}px ({Config.IMAGE_RESIZE_INTERPOLATION} / fast {Config.IMAGE_FAST_INTERPOLATION})
 ║                                                               ║
 ║ Emotion Detection:                                            ║
 ║   Type: {Config.EMOTION_DETECTOR_TYPE}                       
+║   Ensemble Mode: {Config.EMOTION_ENSEMBLE_MODE}              
+║   Deferred: {Config.EMOTION_DEFERRED} (queue {Config.EMOTION_QUEUE_SIZE})
 ║   Confidence Threshold: {Config.EMOTION_CONFIDENCE_THRESHOLD}%
 ║   Smile MAR Threshold: {Config.SMILE_MAR_THRESHOLD}          
 ║                                                               ║
@@ -98,8 +262,15 @@ class Config:
 ║   Cache Type: {Config.CACHE_TYPE}                            
 ║   Cache Timeout: {Config.CACHE_DEFAULT_TIMEOUT}s             
 ║                                                               ║
+║ Webhook:                                                      ║
+║   Async: {Config.WEBHOOK_ASYNC} (queue {Config.WEBHOOK_QUEUE_SIZE}, retries {Config.WEBHOOK_MAX_RETRIES})
+║   Batch: {Config.WEBHOOK_BATCH_ENABLED} (size {Config.WEBHOOK_BATCH_SIZE}, window {Config.WEBHOOK_BATCH_WINDOW}s)
+║                                                               ║
 ║ Flask:                                                        ║
 ║   Debug Mode: {Config.DEBUG}                                 
+║   Startup Warm-up: {Config.STARTUP_WARMUP}                   
+║   Pre-fork: {Config.WEB_WORKERS} workers x {Config.WEB_THREADS} threads, shared gallery {Config.GALLERY_SHARED_ENABLED}
+║   ASGI Mode: CPU executor {Config.ASGI_CPU_EXECUTOR}, {Config.ASGI_WSGI_THREADS} WSGI threads
 ║   Rate Limiting: {Config.RATELIMIT_ENABLED}                  
 ╚══════════════════════════════════════════════════════════════╝
         """
\ No newline at end of file
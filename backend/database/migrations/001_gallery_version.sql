@@ -0,0 +1,10 @@
+-- Migration: generation counter untuk process-level encoding cache
+-- Jalankan sekali pada database yang sudah ada
+
+CREATE TABLE IF NOT EXISTS gallery_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    generation BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO gallery_version (id, generation) VALUES (1, 0)
+ON CONFLICT (id) DO NOTHING;
@@ -0,0 +1,63 @@
+"""
+Migration: konversi face_encodings dari pickle ke format binary v1
+(4 byte header + 128 float32 little-endian)
+
+Jalankan dari folder backend:
+    python database/migrations/002_encodings_float32.py
+
+Aman dijalankan berulang kali: row yang sudah v1 dilewati.
+Setelah selesai, set ALLOW_LEGACY_PICKLE_ENCODINGS=False.
+"""
+
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from models import Database, FaceEncodingModel, encode_face_encoding, ENCODING_HEADER_V1
+
+BATCH_SIZE = 500
+
+
+def main():
+    with Database() as db:
+        cursor = db.connection.cursor()
+        cursor.execute(
+            "SELECT id, encoding FROM face_encodings WHERE substring(encoding from 1 for 4) <> %s ORDER BY id",
+            (ENCODING_HEADER_V1,)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+        
+        print(f"📦 {len(rows)} legacy encodings to migrate")
+        
+        migrated = 0
+        failed = 0
+        for start in range(0, len(rows), BATCH_SIZE):
+            updates = []
+            for row in rows[start:start + BATCH_SIZE]:
+                try:
+                    encoding = pickle.loads(bytes(row['encoding']))
+                    updates.append((encode_face_encoding(encoding), row['id']))
+                except Exception as e:
+                    failed += 1
+                    print(f"   ❌ Encoding ID={row['id']} tidak bisa di-decode: {e}")
+            
+            cursor = db.connection.cursor()
+            cursor.executemany("UPDATE face_encodings SET encoding = %s WHERE id = %s", updates)
+            db.connection.commit()
+            cursor.close()
+            
+            migrated += len(updates)
+            print(f"   ✅ {migrated}/{len(rows)} migrated")
+        
+        if migrated:
+            # Worker lain reload gallery
+            FaceEncodingModel(db).bump_generation()
+        
+        print(f"\n✅ Done: {migrated} migrated, {failed} failed")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+-- Migration: centroid + spread per user untuk prefilter matching
+-- User lama tanpa row di tabel ini tetap di-match (centroid dihitung di memory saat gallery dimuat)
+
+CREATE TABLE IF NOT EXISTS face_centroids (
+    user_id INTEGER PRIMARY KEY,
+    centroid BYTEA NOT NULL,
+    spread FLOAT NOT NULL,
+    num_encodings INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
@@ -0,0 +1,8 @@
+-- Migration: composite index untuk cek "sudah absen hari ini"
+-- Query memakai range timestamp (bukan DATE(timestamp)) sehingga bisa index-only scan
+-- Jalankan sekali pada database yang sudah ada
+
+CREATE INDEX IF NOT EXISTS idx_attendance_user_timestamp ON attendance(user_id, timestamp DESC);
+
+-- Sudah tercakup oleh prefix index di atas
+DROP INDEX IF EXISTS idx_attendance_user_id;
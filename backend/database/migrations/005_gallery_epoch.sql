@@ -0,0 +1,6 @@
+-- Migration: identitas database untuk snapshot shared gallery (utils/shared_gallery.py)
+-- Token acak baru setiap database dibuat / di-reset, sehingga snapshot milik database
+-- lain (atau sebelum reset) dengan generation yang sama tidak ikut dipakai
+
+ALTER TABLE gallery_version
+ADD COLUMN IF NOT EXISTS epoch TEXT NOT NULL DEFAULT md5(random()::text || clock_timestamp()::text);
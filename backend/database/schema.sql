@@ -1,6 +1,8 @@
 -- Database: face_attendance_db
 
 -- Drop tables if exists (untuk development)
+DROP TABLE IF EXISTS gallery_version CASCADE;
+DROP TABLE IF EXISTS face_centroids CASCADE;
 DROP TABLE IF EXISTS attendance CASCADE;
 DROP TABLE IF EXISTS face_encodings CASCADE;
 DROP TABLE IF EXISTS users CASCADE;
@@ -17,11 +19,21 @@ CREATE TABLE users (
 CREATE TABLE face_encodings (
     id SERIAL PRIMARY KEY,
     user_id INTEGER NOT NULL,
-    encoding BYTEA NOT NULL,
+    encoding BYTEA NOT NULL,  -- v1: 4 byte header + 128 float32 little-endian
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Table: face_centroids (centroid + spread per user untuk prefilter matching)
+CREATE TABLE face_centroids (
+    user_id INTEGER PRIMARY KEY,
+    centroid BYTEA NOT NULL,  -- format sama dengan face_encodings.encoding (v1)
+    spread FLOAT NOT NULL,    -- jarak maksimum encoding ke centroid
+    num_encodings INTEGER NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
 -- Table: attendance (with mood tracking)
 CREATE TABLE attendance (
     id SERIAL PRIMARY KEY,
@@ -36,10 +48,21 @@ CREATE TABLE attendance (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
+-- Table: gallery_version (generation counter untuk encoding cache di setiap worker)
+CREATE TABLE gallery_version (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    generation BIGINT NOT NULL DEFAULT 0,
+    -- Identitas database (acak per create/reset), dicek saat map snapshot shared gallery
+    epoch TEXT NOT NULL DEFAULT md5(random()::text || clock_timestamp()::text)
+);
+
+INSERT INTO gallery_version (id, generation) VALUES (1, 0);
+
 -- Create indexes for better performance
 CREATE INDEX idx_users_nim ON users(nim);
 CREATE INDEX idx_face_encodings_user_id ON face_encodings(user_id);
-CREATE INDEX idx_attendance_user_id ON attendance(user_id);
+-- (user_id, timestamp) juga melayani filter user_id saja
+CREATE INDEX idx_attendance_user_timestamp ON attendance(user_id, timestamp DESC);
 CREATE INDEX idx_attendance_timestamp ON attendance(timestamp);
 CREATE INDEX idx_attendance_mood ON attendance(mood);
 
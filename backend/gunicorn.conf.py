@@ -0,0 +1,79 @@
+"""
+Pre-fork serving mode (multi-process, semua core CPU)
+
+Usage (dari folder backend):
+    gunicorn -c gunicorn.conf.py app:app
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker asgi:app
+
+- preload_app: app di-import sekali di master dan warm-up dlib ditunggu sampai
+  selesai sebelum fork, sehingga memori model dibagi copy-on-write oleh semua worker.
+  FER/MTCNN (TensorFlow) tidak fork-safe: thread pool dan state session-nya tidak
+  ikut ter-fork dengan benar, jadi di-load per worker di post_fork
+- when_ready (master, sebelum fork): load gallery sekali dan publish snapshot
+  ke shared dir (GALLERY_SHARED_ENABLED), lalu tutup koneksi database master
+  agar socket tidak ikut diwariskan ke worker
+- Setiap worker punya slot tetap (0..WEB_WORKERS-1) untuk spool webhook sendiri.
+  Worker pengganti memakai slot yang sama, jadi event yang tertinggal tetap dikirim
+"""
+
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import Config
+
+bind = Config.WEB_BIND
+workers = Config.WEB_WORKERS
+threads = Config.WEB_THREADS
+worker_class = 'gthread'
+timeout = Config.WEB_TIMEOUT
+preload_app = Config.WEB_PRELOAD
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        # Tanpa preload, worker pertama yang load dari database mem-publish snapshot
+        return
+    
+    from app import encoding_cache, get_db, start_warmup
+    from models import get_pool
+    from utils.face_recognition import validate_face_profiles
+    from utils.startup import timed
+    
+    print(Config.get_config_summary())
+    validate_face_profiles()
+    
+    # Hanya dlib di master agar ikut ter-fork (worker tidak load ulang).
+    # TensorFlow tidak boleh di-import sebelum fork
+    start_warmup(wait=True, only=('dlib',))
+    
+    try:
+        with timed('startup:encoding_cache'), get_db() as db:
+            encoding_cache.load(db)
+    except Exception as e:
+        print(f"⚠️ Encoding cache preload failed (will load on first request): {e}")
+    
+    get_pool().closeall()
+
+
+def pre_fork(server, worker):
+    # Slot terkecil yang belum dipakai worker lain (dijalankan di master)
+    used = {getattr(w, 'slot', None) for w in server.WORKERS.values()}
+    worker.slot = next(slot for slot in itertools.count() if slot not in used)
+
+
+def post_fork(server, worker):
+    from app import n8n_webhook, start_warmup
+    
+    # Slot 0 memakai spool utama (sama dengan mode single process)
+    if n8n_webhook.spool_path and worker.slot > 0:
+        n8n_webhook.spool_path = f"{Config.WEBHOOK_SPOOL_FILE}.{worker.slot}"
+    
+    # Thread tidak ikut ter-fork: worker webhook di-start per process
+    n8n_webhook.start()
+    
+    # FER selalu per worker; dlib hanya jika belum di-load di master (tanpa preload)
+    start_warmup()
+    server.log.info(f"Worker {worker.pid} ready (slot {worker.slot})")
@@ -1,27 +1,209 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import PoolError
 from config import Config
+import numpy as np
 import pickle
-from datetime import datetime
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+class ConnectionPool:
+    """
+    Bounded, thread-safe connection pool
+    - getconn() menunggu (max timeout detik) jika semua koneksi sedang dipakai
+    - Koneksi idle yang lama tidak dipakai divalidasi dulu sebelum dipinjamkan
+    """
+    
+    def __init__(self, minconn, maxconn, timeout, validate_idle_after):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_idle_after = validate_idle_after
+        
+        self._idle = []  # list of (connection, last_used)
+        self._in_use = 0
+        self._cond = threading.Condition()
+        
+        self._stats = {
+            'checkouts': 0,
+            'created': 0,
+            'discarded': 0,
+            'waits': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0
+        }
+        
+        for _ in range(minconn):
+            self._idle.append((self._create(), time.monotonic()))
+    
+    def _create(self):
+        conn = psycopg2.connect(
+            Config.get_db_connection_string(),
+            cursor_factory=RealDictCursor
+        )
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+    
+    def _is_healthy(self, conn):
+        """Health check ringan untuk koneksi idle"""
+        if conn.closed:
+            return False
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def getconn(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        conn = None
+        last_used = None
+        
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._in_use + len(self._idle) < self.maxconn:
+                    break
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolError(f"Connection pool exhausted (waited {self.timeout}s)")
+                waited = True
+                self._cond.wait(remaining)
+            
+            # Slot sudah di-reserve, koneksi dibuat/divalidasi di luar lock
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            if waited:
+                wait_time = time.monotonic() - start
+                self._stats['waits'] += 1
+                self._stats['wait_time_total'] += wait_time
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], wait_time)
+        
+        try:
+            if conn is not None and (
+                conn.closed or
+                (time.monotonic() - last_used > self.validate_idle_after and not self._is_healthy(conn))
+            ):
+                self._discard(conn)
+                conn = None
+            
+            if conn is None:
+                conn = self._create()
+            return conn
+        except Exception:
+            # Gagal membuat koneksi, lepaskan slot
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+    
+    def putconn(self, conn):
+        discard = conn.closed
+        
+        if not discard:
+            try:
+                # Reset transaksi yang masih terbuka sebelum dikembalikan ke pool
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        
+        if discard:
+            self._discard(conn)
+        
+        with self._cond:
+            self._in_use -= 1
+            if not discard:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+    
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats['discarded'] += 1
+    
+    def closeall(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'size': self._in_use + len(self._idle),
+                'max_size': self.maxconn,
+                'wait_time_avg': (stats['wait_time_total'] / stats['waits']) if stats['waits'] else 0.0
+            })
+        return stats
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Shared pool per process (dibuat saat pertama kali dipakai)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    Config.DB_POOL_MIN_CONN,
+                    Config.DB_POOL_MAX_CONN,
+                    Config.DB_POOL_TIMEOUT,
+                    Config.DB_POOL_VALIDATE_IDLE
+                )
+    return _pool
 
 class Database:
     def __init__(self):
         self.connection = None
     
     def connect(self):
+        """Pinjam koneksi dari pool"""
         try:
-            self.connection = psycopg2.connect(
-                Config.get_db_connection_string(),
-                cursor_factory=RealDictCursor
-            )
+            self.connection = get_pool().getconn()
             return self.connection
         except Exception as e:
             print(f"Database connection error: {e}")
             raise
     
     def close(self):
+        """Kembalikan koneksi ke pool"""
         if self.connection:
-            self.connection.close()
+            get_pool().putconn(self.connection)
+            self.connection = None
+    
+    def __enter__(self):
+        if not self.connection:
+            self.connect()
+        return self
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
     
     def execute_query(self, query, params=None, fetch=False):
         try:
@@ -49,6 +231,50 @@ class Database:
             print(f"Commit error: {e}")
             raise
 
+# Format encoding v1: header 4 byte + 128 float32 little-endian (516 byte per row)
+# Header 4 byte = satu slot float32, sehingga hasil query yang digabung bisa dibaca
+# dengan satu np.frombuffer lalu reshape (N, 129)
+ENCODING_DIM = 128
+ENCODING_HEADER_V1 = b'FE\x01\x00'
+ENCODING_SIZE_V1 = len(ENCODING_HEADER_V1) + ENCODING_DIM * 4
+
+def encode_face_encoding(encoding):
+    """numpy array (128,) -> bytes format v1"""
+    return ENCODING_HEADER_V1 + np.asarray(encoding, dtype='<f4').reshape(ENCODING_DIM).tobytes()
+
+def decode_face_encodings(blobs):
+    """
+    List BYTEA -> matrix float32 (N, 128)
+    Row format v1 di-decode sekaligus dengan satu np.frombuffer,
+    row lama (pickle) hanya di-unpickle jika Config.ALLOW_LEGACY_PICKLE_ENCODINGS
+    Returns: (matrix, valid_mask)
+    """
+    blobs = [bytes(b) for b in blobs]
+    is_v1 = np.array(
+        [len(b) == ENCODING_SIZE_V1 and b[:4] == ENCODING_HEADER_V1 for b in blobs],
+        dtype=bool
+    )
+    
+    matrix = np.zeros((len(blobs), ENCODING_DIM), dtype=np.float32)
+    valid = is_v1.copy()
+    
+    if is_v1.any():
+        joined = b''.join(b for b, v1 in zip(blobs, is_v1) if v1)
+        # Kolom 0 = header, sisanya encoding
+        matrix[is_v1] = np.frombuffer(joined, dtype='<f4').reshape(-1, ENCODING_DIM + 1)[:, 1:]
+    
+    legacy = np.flatnonzero(~is_v1)
+    if len(legacy) > 0:
+        if Config.ALLOW_LEGACY_PICKLE_ENCODINGS:
+            print(f"⚠️ {len(legacy)} legacy pickled encodings, jalankan database/migrations/002_encodings_float32.py")
+            for idx in legacy:
+                matrix[idx] = np.asarray(pickle.loads(blobs[idx]), dtype=np.float32)
+                valid[idx] = True
+        else:
+            print(f"⚠️ Skipping {len(legacy)} legacy pickled encodings (ALLOW_LEGACY_PICKLE_ENCODINGS=False)")
+    
+    return matrix, valid
+
 class UserModel:
     def __init__(self, db):
         self.db = db
@@ -77,6 +303,41 @@ class UserModel:
             traceback.print_exc()
             return None
     
+    def create_user_with_encodings(self, nama, nim, encodings, centroid=None, spread=None):
+        """
+        Registrasi dalam satu transaksi: user + semua encoding (execute_values)
+        + centroid + generation bump, satu commit. Gagal di tengah -> rollback,
+        tidak ada user tanpa encoding
+        Returns: (user, generation) atau (None, None) jika gagal
+        """
+        try:
+            query = """
+                INSERT INTO users (nama, nim) 
+                VALUES (%s, %s) 
+                RETURNING id, nama, nim, created_at
+            """
+            cursor = self.db.connection.cursor()
+            cursor.execute(query, (nama, nim))
+            user = cursor.fetchone()
+            cursor.close()
+            
+            face_model = FaceEncodingModel(self.db)
+            face_model.save_encodings(user['id'], encodings, commit=False)
+            if centroid is not None:
+                face_model.save_centroid(user['id'], centroid, spread, len(encodings), commit=False)
+            generation = face_model.bump_generation(commit=False)
+            
+            self.db.connection.commit()
+            print(f"✅ User registered: ID={user['id']}, Nama={user['nama']}, {len(encodings)} encodings")
+            
+            return user, generation
+        except Exception as e:
+            self.db.connection.rollback()
+            print(f"❌ Error registering user: {e}")
+            import traceback
+            traceback.print_exc()
+            return None, None
+    
     def get_user_by_nim(self, nim):
         query = "SELECT * FROM users WHERE nim = %s"
         result = self.db.execute_query(query, (nim,), fetch=True)
@@ -93,25 +354,33 @@ class UserModel:
         return result[0]['count'] > 0
     
     def delete_user(self, user_id):
-        """Delete user and all related data (CASCADE)"""
+        """
+        Delete user and all related data (CASCADE) + generation bump, satu commit
+        Returns: (user, generation) atau (None, None) jika tidak ada / gagal
+        """
         try:
             query = "DELETE FROM users WHERE id = %s RETURNING id, nama, nim"
             cursor = self.db.connection.cursor()
             cursor.execute(query, (user_id,))
             result = cursor.fetchone()
-            self.db.connection.commit()
             cursor.close()
             
-            if result:
-                print(f"✅ User deleted: {result['nama']} ({result['nim']})")
+            if not result:
+                self.db.connection.rollback()
+                return None, None
             
-            return result if result else None
+            generation = FaceEncodingModel(self.db).bump_generation(commit=False)
+            
+            self.db.connection.commit()
+            print(f"✅ User deleted: {result['nama']} ({result['nim']})")
+            
+            return result, generation
         except Exception as e:
             self.db.connection.rollback()
             print(f"❌ Error deleting user: {e}")
             import traceback
             traceback.print_exc()
-            return None
+            return None, None
 
 class FaceEncodingModel:
     def __init__(self, db):
@@ -119,7 +388,7 @@ class FaceEncodingModel:
     
     def save_encoding(self, user_id, encoding):
         try:
-            encoding_bytes = pickle.dumps(encoding)
+            encoding_bytes = encode_face_encoding(encoding)
             query = """
                 INSERT INTO face_encodings (user_id, encoding) 
                 VALUES (%s, %s)
@@ -149,20 +418,138 @@ class FaceEncodingModel:
             JOIN users u ON fe.user_id = u.id
         """
         results = self.db.execute_query(query, fetch=True)
+        return self._decode_results(results)
+    
+    def get_all_centroids(self):
+        """
+        Centroid tersimpan: user_id -> (centroid, spread, num_encodings)
+        User tanpa row (terdaftar sebelum migration 003) tidak ada di dict
+        """
+        query = "SELECT user_id, centroid, spread, num_encodings FROM face_centroids"
+        try:
+            results = self.db.execute_query(query, fetch=True)
+        except Exception:
+            # Migration 003 belum dijalankan: centroid dihitung di memory
+            return {}
+        if not results:
+            return {}
         
-        for result in results:
-            result['encoding'] = pickle.loads(result['encoding'])
-        
-        return results
+        matrix, valid = decode_face_encodings([r['centroid'] for r in results])
+        return {
+            r['user_id']: (matrix[idx], float(r['spread']), r['num_encodings'])
+            for idx, r in enumerate(results) if valid[idx]
+        }
     
     def get_encodings_by_user_id(self, user_id):
         query = "SELECT * FROM face_encodings WHERE user_id = %s"
         results = self.db.execute_query(query, (user_id,), fetch=True)
+        return self._decode_results(results)
+    
+    def _decode_results(self, results):
+        """Decode kolom encoding semua row sekaligus (row yang tidak valid dibuang)"""
+        if not results:
+            return results
+        
+        matrix, valid = decode_face_encodings([r['encoding'] for r in results])
         
-        for result in results:
-            result['encoding'] = pickle.loads(result['encoding'])
+        decoded = []
+        for idx, result in enumerate(results):
+            if valid[idx]:
+                result['encoding'] = matrix[idx]
+                decoded.append(result)
         
-        return results
+        return decoded
+
+    def save_encodings(self, user_id, encodings, commit=True):
+        """
+        Bulk insert semua encoding user dengan satu multi-row INSERT (execute_values)
+        commit=False: bagian dari transaksi pemanggil, error di-raise
+        Returns: list id encoding
+        """
+        try:
+            query = "INSERT INTO face_encodings (user_id, encoding) VALUES %s RETURNING id"
+            cursor = self.db.connection.cursor()
+            result = execute_values(
+                cursor,
+                query,
+                [(user_id, encode_face_encoding(encoding)) for encoding in encodings],
+                page_size=max(1, len(encodings)),
+                fetch=True
+            )
+            if commit:
+                self.db.connection.commit()
+            cursor.close()
+            
+            print(f"   ✅ {len(result)} face encodings saved for user_id={user_id}")
+            return [row['id'] for row in result]
+        except Exception as e:
+            if not commit:
+                raise
+            self.db.connection.rollback()
+            print(f"   ❌ Error saving encodings: {e}")
+            return []
+    
+    def save_centroid(self, user_id, centroid, spread, num_encodings, commit=True):
+        """Simpan (upsert) centroid + spread user"""
+        try:
+            query = """
+                INSERT INTO face_centroids (user_id, centroid, spread, num_encodings)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (user_id) DO UPDATE
+                SET centroid = EXCLUDED.centroid,
+                    spread = EXCLUDED.spread,
+                    num_encodings = EXCLUDED.num_encodings,
+                    updated_at = CURRENT_TIMESTAMP
+            """
+            cursor = self.db.connection.cursor()
+            cursor.execute(query, (user_id, encode_face_encoding(centroid), float(spread), num_encodings))
+            if commit:
+                self.db.connection.commit()
+            cursor.close()
+            return True
+        except Exception as e:
+            if not commit:
+                raise
+            self.db.connection.rollback()
+            print(f"   ❌ Error saving centroid: {e}")
+            return False
+    
+    def get_generation(self):
+        """Generation counter gallery (naik setiap register/delete)"""
+        query = "SELECT generation FROM gallery_version WHERE id = 1"
+        result = self.db.execute_query(query, fetch=True)
+        return result[0]['generation'] if result else 0
+    
+    def get_epoch(self):
+        """Token identitas database (migration 005). None jika kolom belum ada"""
+        try:
+            result = self.db.execute_query("SELECT epoch FROM gallery_version WHERE id = 1", fetch=True)
+        except Exception:
+            return None
+        return result[0]['epoch'] if result else None
+    
+    def bump_generation(self, commit=True):
+        """Naikkan generation counter, return nilai baru"""
+        try:
+            query = """
+                UPDATE gallery_version SET generation = generation + 1
+                WHERE id = 1
+                RETURNING generation
+            """
+            cursor = self.db.connection.cursor()
+            cursor.execute(query)
+            result = cursor.fetchone()
+            if commit:
+                self.db.connection.commit()
+            cursor.close()
+            
+            return result['generation'] if result else None
+        except Exception as e:
+            if not commit:
+                raise
+            self.db.connection.rollback()
+            print(f"❌ Error bumping gallery generation: {e}")
+            return None
 
 class AttendanceModel:
     def __init__(self, db):
@@ -192,16 +579,116 @@ class AttendanceModel:
             (user_id, confidence_score, status, timestamp, mood, mood_confidence, mood_emoji), 
             fetch=True
         )
+        # fetch=True tidak commit, koneksi pool di-rollback saat dikembalikan
+        self.db.commit()
         return result[0] if result else None
     
+    def record_attendance_batch(self, records, status='hadir'):
+        """
+        Record banyak attendance dengan satu multi-row INSERT
+        records: list (user_id, confidence_score, mood, mood_confidence, mood_emoji), user_id unik
+        Returns: list row hasil INSERT (urutan sama dengan records)
+        """
+        if not records:
+            return []
+        
+        timestamp = datetime.now()
+        values = [
+            (
+                user_id,
+                float(confidence_score),
+                status,
+                timestamp,
+                mood,
+                float(mood_confidence) if mood_confidence is not None else None,
+                mood_emoji
+            )
+            for user_id, confidence_score, mood, mood_confidence, mood_emoji in records
+        ]
+        
+        query = """
+            INSERT INTO attendance (user_id, confidence_score, status, timestamp, mood, mood_confidence, mood_emoji)
+            VALUES %s
+            RETURNING id, user_id, timestamp, confidence_score, status, mood, mood_confidence, mood_emoji
+        """
+        try:
+            cursor = self.db.connection.cursor()
+            result = execute_values(cursor, query, values, page_size=len(values), fetch=True)
+            self.db.connection.commit()
+            cursor.close()
+        except Exception as e:
+            self.db.connection.rollback()
+            print(f"Query execution error: {e}")
+            raise
+        
+        # RETURNING tidak menjamin urutan -> susun ulang per user_id
+        by_user = {row['user_id']: row for row in result}
+        return [by_user[user_id] for user_id, *_ in records]
+    
+    def get_last_attendance_today_for_users(self, user_ids):
+        """Timestamp absen terakhir hari ini untuk banyak user -> dict user_id: timestamp"""
+        if not user_ids:
+            return {}
+        
+        query = """
+            SELECT user_id, MAX(timestamp) AS timestamp FROM attendance
+            WHERE user_id = ANY(%s)
+            AND timestamp >= %s AND timestamp < %s
+            GROUP BY user_id
+        """
+        rows = self.db.execute_query(query, (list(user_ids), *self.today_range()), fetch=True)
+        return {row['user_id']: row['timestamp'] for row in rows}
+    
+    def update_mood(self, attendance_id, mood, mood_confidence, mood_emoji):
+        """Isi kolom mood setelah deferred emotion detection selesai"""
+        query = """
+            UPDATE attendance
+            SET mood = %s, mood_confidence = %s, mood_emoji = %s
+            WHERE id = %s
+        """
+        return self.db.execute_query(query, (mood, mood_confidence, mood_emoji, attendance_id))
+    
+    def get_attendance_mood(self, attendance_id):
+        query = """
+            SELECT id, mood, mood_confidence, mood_emoji
+            FROM attendance
+            WHERE id = %s
+        """
+        result = self.db.execute_query(query, (attendance_id,), fetch=True)
+        return result[0] if result else None
+    
+    @staticmethod
+    def today_range():
+        """
+        [awal hari ini, awal besok) menurut jam aplikasi (sama dengan datetime.now()
+        di record_attendance). Range pada kolom mentah bisa memakai index, DATE(timestamp) tidak
+        """
+        start = datetime.combine(date.today(), datetime.min.time())
+        return start, start + timedelta(days=1)
+    
     def get_today_attendance(self, user_id):
         query = """
             SELECT * FROM attendance 
             WHERE user_id = %s 
-            AND DATE(timestamp) = CURRENT_DATE
+            AND timestamp >= %s AND timestamp < %s
+            ORDER BY timestamp DESC
+        """
+        return self.db.execute_query(query, (user_id, *self.today_range()), fetch=True)
+    
+    def get_last_attendance_today(self, user_id):
+        """
+        Timestamp absen terakhir hari ini, None jika belum absen
+        Hanya membaca idx_attendance_user_timestamp (index-only scan, LIMIT 1)
+        """
+        query = """
+            SELECT timestamp FROM attendance
+            WHERE user_id = %s
+            AND timestamp >= %s AND timestamp < %s
             ORDER BY timestamp DESC
+            LIMIT 1
         """
-        return self.db.execute_query(query, (user_id,), fetch=True)
+        result = self.db.execute_query(query, (user_id, *self.today_range()), fetch=True)
+        return result[0]['timestamp'] if result else None
     
     def get_all_attendance(self, limit=100):
         query = """
@@ -0,0 +1,74 @@
+"""
+Quality check registrasi / check-in harus memberi keputusan yang sama dengan
+validate_image_quality versi lama (grayscale + Laplacian pada resolusi asli)
+
+Jalankan (dari folder backend):
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+
+def legacy_validate(image):
+    """validate_image_quality sebelum quality record (threshold bawaan)"""
+    height, width = image.shape[:2]
+    if width < 100 or height < 100:
+        return False
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    brightness = np.mean(gray)
+    if brightness < 15 or brightness > 245:
+        return False
+    return cv2.Laplacian(gray, cv2.CV_64F).var() >= 50
+
+
+def make_frame(blur):
+    """Frame 640x480 deterministik: gradien + kotak bertekstur, di-blur dengan sigma `blur`"""
+    rng = np.random.default_rng(0)
+    image = np.tile(np.linspace(60, 190, 640, dtype=np.float64), (480, 1))
+    image[120:360, 200:440] += rng.normal(0, 25, (240, 240))
+    image = np.clip(image, 0, 255).astype(np.uint8)
+    image = np.dstack([image] * 3)
+    if blur:
+        image = cv2.GaussianBlur(image, (0, 0), blur)
+    return image
+
+
+@unittest.skipIf(cv2 is None, "opencv tidak terpasang")
+class QualityDecisionTest(unittest.TestCase):
+    def setUp(self):
+        from utils.face_recognition import FaceRecognitionHandler
+        self.handler = FaceRecognitionHandler()
+    
+    def assert_same_decision(self, image):
+        is_valid, _ = self.handler.validate_image_quality(image)
+        self.assertEqual(is_valid, legacy_validate(image))
+        return is_valid
+    
+    def test_sharp_frame_accepted(self):
+        self.assertTrue(self.assert_same_decision(make_frame(blur=0)))
+    
+    def test_blurry_frame_rejected(self):
+        self.assertFalse(self.assert_same_decision(make_frame(blur=3)))
+    
+    def test_decision_matches_legacy_around_threshold(self):
+        for blur in np.linspace(0.5, 3.0, 11):
+            with self.subTest(blur=blur):
+                self.assert_same_decision(make_frame(blur=blur))
+    
+    def test_dark_frame_rejected(self):
+        self.assertFalse(self.assert_same_decision(np.full((480, 640, 3), 10, dtype=np.uint8)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+"""
+Micro-batching untuk request check-in yang datang hampir bersamaan (banyak kiosk)
+Setiap request tetap melakukan decode + deteksi wajah sendiri, lalu menitipkan
+(image, face_location) ke scheduler. Scheduler mengumpulkan wajah yang datang
+dalam CHECKIN_BATCH_MAX_WAIT_MS (maks CHECKIN_BATCH_MAX_SIZE), lalu untuk satu batch:
+- satu batched forward pass dlib (encode_faces_batch)
+- satu GEMM ke gallery (compare_faces_batch)
+- satu query "sudah absen hari ini" (CheckinCache.get_last_checkins)
+Hasil dikembalikan ke masing-masing request lewat Future. Wajah yang gagal
+di-encode hanya menggagalkan Future request itu sendiri, bukan satu batch
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from config import Config
+
+
+class CheckinBatcher:
+    def __init__(self, face_handler, encoding_cache, checkin_cache, get_db,
+                 max_batch_size=None, max_wait_ms=None):
+        self.face_handler = face_handler
+        self.encoding_cache = encoding_cache
+        self.checkin_cache = checkin_cache
+        self.get_db = get_db
+        
+        self.max_batch_size = max_batch_size or Config.CHECKIN_BATCH_MAX_SIZE
+        max_wait_ms = Config.CHECKIN_BATCH_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms
+        self.max_wait = max_wait_ms / 1000.0
+        
+        self.queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        
+        self._lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'batches': 0,
+            'failed_requests': 0,
+            'failed_batches': 0,
+            'max_batch': 0
+        }
+    
+    def submit(self, image, face_location):
+        """
+        Titipkan satu wajah. Returns: Future dengan hasil dict
+        {encoding, match, user_data, confidence, last_attendance, gallery_empty}
+        Future yang di-cancel sebelum diambil scheduler (misalnya caller timeout) dilewati
+        """
+        self._ensure_worker()
+        future = Future()
+        self.queue.put((image, face_location, future))
+        
+        with self._lock:
+            self._stats['requests'] += 1
+        
+        return future
+    
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='checkin-batcher', daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            batch.extend(self._collect_batch())
+            
+            # Buang request yang sudah di-cancel, sisanya tidak bisa di-cancel lagi
+            batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            
+            try:
+                self._process(batch)
+            except Exception as e:
+                with self._lock:
+                    self._stats['failed_batches'] += 1
+                print(f"❌ Check-in batch failed ({len(batch)} faces): {e}")
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+    
+    def _collect_batch(self):
+        """Ambil wajah berikutnya sampai max_batch_size atau max_wait tercapai"""
+        batch = []
+        deadline = time.monotonic() + self.max_wait
+        
+        while len(batch) + 1 < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _encode(self, batch):
+        """
+        Encode semua wajah dalam satu forward pass. Jika gagal, encode ulang satu per satu:
+        item yang tetap gagal mendapat exception di Future-nya sendiri
+        Returns: (batch yang berhasil, encodings)
+        """
+        try:
+            return batch, self.face_handler.encode_faces_batch(
+                [image for image, _, _ in batch],
+                [location for _, location, _ in batch]
+            )
+        except Exception as e:
+            print(f"⚠️ Batched encoding failed ({len(batch)} faces), retry per face: {e}")
+        
+        encoded = []
+        encodings = []
+        for image, location, future in batch:
+            try:
+                encodings.extend(self.face_handler.encode_faces_batch([image], [location]))
+                encoded.append((image, location, future))
+            except Exception as e:
+                with self._lock:
+                    self._stats['failed_requests'] += 1
+                future.set_exception(e)
+        
+        return encoded, encodings
+    
+    def _process(self, batch):
+        batch, encodings = self._encode(batch)
+        if not batch:
+            return
+        
+        with self.get_db() as db:
+            gallery = self.encoding_cache.get_gallery(db)
+        
+        if len(gallery) == 0:
+            matches = [(False, None, 0.0)] * len(batch)
+        else:
+            matches = self.face_handler.compare_faces_batch(gallery, encodings)
+        
+        matched_ids = list({user_data['user_id'] for match, user_data, _ in matches if match})
+        last_checkins = self.checkin_cache.get_last_checkins(self.get_db, matched_ids)
+        
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['max_batch'] = max(self._stats['max_batch'], len(batch))
+        
+        for (_, _, future), encoding, (match, user_data, confidence) in zip(batch, encodings, matches):
+            future.set_result({
+                'encoding': encoding,
+                'match': match,
+                'user_data': user_data,
+                'confidence': confidence,
+                'last_attendance': last_checkins.get(user_data['user_id']) if match else None,
+                'gallery_empty': len(gallery) == 0
+            })
+    
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = self.queue.qsize()
+        stats['avg_batch'] = round(stats['requests'] / stats['batches'], 2) if stats['batches'] else 0
+        return stats
@@ -0,0 +1,91 @@
+"""
+Per-process set user yang sudah absen hari ini
+Check-in berulang (user yang sama di depan kamera) tidak perlu query database.
+Set dikosongkan otomatis saat tanggal berganti. Miss tetap dicek ke database,
+sehingga aman dipakai di beberapa worker process sekaligus
+"""
+
+import threading
+from datetime import date
+from models import AttendanceModel
+
+
+class CheckinCache:
+    def __init__(self):
+        # user_id -> timestamp absen terakhir hari ini
+        self.checked_in = {}
+        self.day = date.today()
+        self.lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'resets': 0
+        }
+    
+    def _roll_over(self):
+        # Dipanggil dengan lock dipegang
+        today = date.today()
+        if today != self.day:
+            self.checked_in.clear()
+            self.day = today
+            self._stats['resets'] += 1
+    
+    def get(self, user_id):
+        """Timestamp absen hari ini dari cache, None jika belum tercatat di proses ini"""
+        with self.lock:
+            self._roll_over()
+            timestamp = self.checked_in.get(user_id)
+            self._stats['hits' if timestamp is not None else 'misses'] += 1
+            return timestamp
+    
+    def mark(self, user_id, timestamp):
+        with self.lock:
+            self._roll_over()
+            # Timestamp dari hari sebelumnya (request yang melewati tengah malam) diabaikan
+            if timestamp.date() == self.day:
+                self.checked_in[user_id] = timestamp
+    
+    def discard(self, user_id):
+        with self.lock:
+            self.checked_in.pop(user_id, None)
+    
+    def get_last_checkin(self, get_db, user_id):
+        """
+        Cache dulu, lalu database (koneksi hanya dipinjam saat miss)
+        get_db: factory koneksi, dipakai sebagai `with get_db() as db:`
+        Returns: timestamp atau None
+        """
+        timestamp = self.get(user_id)
+        if timestamp is None:
+            with get_db() as db:
+                timestamp = AttendanceModel(db).get_last_attendance_today(user_id)
+            if timestamp is not None:
+                self.mark(user_id, timestamp)
+        return timestamp
+    
+    def get_last_checkins(self, get_db, user_ids):
+        """Versi batch: satu query untuk semua user yang tidak ada di cache -> dict user_id: timestamp"""
+        found = {}
+        missing = []
+        for user_id in user_ids:
+            timestamp = self.get(user_id)
+            if timestamp is None:
+                missing.append(user_id)
+            else:
+                found[user_id] = timestamp
+        
+        if missing:
+            with get_db() as db:
+                rows = AttendanceModel(db).get_last_attendance_today_for_users(missing)
+            for user_id, timestamp in rows.items():
+                self.mark(user_id, timestamp)
+                found[user_id] = timestamp
+        
+        return found
+    
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self.checked_in)
+            stats['day'] = self.day.isoformat()
+        return stats
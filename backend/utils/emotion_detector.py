@@ -3,15 +3,21 @@ Optimized Emotion Detector dengan Confidence Calibration
 Menggunakan FER + Ensemble untuk hasil lebih stabil
 """
 
-from fer import FER
 import cv2
 import numpy as np
+import threading
 from collections import Counter
+from config import Config
+from utils.startup import LazyModule, timed
+
+# fer meng-import TensorFlow (beberapa detik), jadi di-import saat detector pertama dibuat
+fer = LazyModule('fer')
 
 class EmotionDetectorFER:
     def __init__(self):
-        # Initialize FER detector dengan MTCNN
-        self.detector = FER(mtcnn=True)
+        # FER detector dengan MTCNN dibuat saat pertama dipakai (lihat property detector)
+        self._detector = None
+        self._detector_lock = threading.Lock()
         
         # Simplified emotions
         self.emotions_map = {
@@ -42,6 +48,23 @@ class EmotionDetectorFER:
             'negative': '#ef4444'
         }
     
+    @property
+    def detector(self):
+        """FER(mtcnn=True), dibuat sekali secara thread-safe"""
+        if self._detector is None:
+            with self._detector_lock:
+                if self._detector is None:
+                    FER = fer.FER
+                    with timed('model:fer'):
+                        self._detector = FER(mtcnn=True)
+        return self._detector
+    
+    def warm_up(self):
+        """Load FER/MTCNN + dummy inference (MTCNN dan classifier emosi)"""
+        dummy = np.zeros((160, 160, 3), dtype=np.uint8)
+        self.detector.detect_emotions(dummy)
+        self.detector.detect_emotions(dummy, face_rectangles=[(20, 20, 120, 120)])
+    
     def preprocess_image(self, image):
         """Enhanced preprocessing untuk emotion detection"""
         try:
@@ -71,14 +94,42 @@ class EmotionDetectorFER:
         except:
             return image
     
-    def detect_emotion_single(self, image):
-        """Single detection"""
+    def crop_face(self, image, face_location, margin=0.3):
+        """
+        Crop ROI wajah dari box face_recognition (top, right, bottom, left)
+        Returns: (roi, face_rectangle) dengan face_rectangle (x, y, w, h) relatif ke ROI
+        """
+        top, right, bottom, left = face_location
+        height, width = image.shape[:2]
+        
+        pad_y = int((bottom - top) * margin)
+        pad_x = int((right - left) * margin)
+        
+        y1 = max(0, top - pad_y)
+        y2 = min(height, bottom + pad_y)
+        x1 = max(0, left - pad_x)
+        x2 = min(width, right + pad_x)
+        
+        roi = image[y1:y2, x1:x2]
+        face_rectangle = (left - x1, top - y1, right - left, bottom - top)
+        
+        return roi, face_rectangle
+    
+    def detect_emotion_single(self, image, face_rectangle=None):
+        """
+        Single detection
+        face_rectangle (x, y, w, h): jika ada, MTCNN dilewati dan FER langsung
+        mengklasifikasi box tersebut
+        """
         try:
             # Preprocess
             processed = self.preprocess_image(image)
             
             # Detect emotions
-            results = self.detector.detect_emotions(processed)
+            if face_rectangle is not None:
+                results = self.detector.detect_emotions(processed, face_rectangles=[face_rectangle])
+            else:
+                results = self.detector.detect_emotions(processed)
             
             if not results or len(results) == 0:
                 return None
@@ -92,55 +143,98 @@ class EmotionDetectorFER:
             print(f"⚠️ Detection error: {e}")
             return None
     
-    def detect_emotion(self, image, use_ensemble=True):
+    def get_ensemble_variants(self, image, mode):
+        """
+        Variasi input untuk ensemble (masing-masing hanya diproses sekali)
+        off: enhanced | light: original + enhanced | full: + brightened
+        """
+        enhanced = self.preprocess_image(image)
+        
+        if mode == 'off':
+            return [enhanced]
+        
+        variants = [image, enhanced]
+        
+        if mode == 'full':
+            # Slightly brightened
+            variants.append(cv2.convertScaleAbs(image, alpha=1.1, beta=10))
+        
+        return variants
+    
+    def classify_batch(self, images, face_rectangle):
+        """
+        Klasifikasi semua variasi dalam SATU forward pass.
+        Variasi disusun berdampingan dalam satu canvas, lalu FER menerima satu
+        face rectangle per tile sehingga semua wajah diprediksi sebagai satu batch.
+        """
+        height, width = images[0].shape[:2]
+        gap = max(20, width // 4)
+        
+        canvas = np.zeros(
+            (height, len(images) * width + (len(images) - 1) * gap, 3),
+            dtype=np.uint8
+        )
+        
+        x, y, w, h = face_rectangle
+        rectangles = []
+        for idx, variant in enumerate(images):
+            offset = idx * (width + gap)
+            canvas[:, offset:offset + width] = variant
+            rectangles.append((x + offset, y, w, h))
+        
+        results = self.detector.detect_emotions(canvas, face_rectangles=rectangles)
+        
+        return [r['emotions'] for r in results if r.get('emotions')]
+    
+    def find_face_location(self, image):
+        """Fallback jika tidak ada box dari face recognition: MTCNN sekali saja"""
+        rectangles = self.detector.find_faces(self.preprocess_image(image), bgr=True)
+        
+        if rectangles is None or len(rectangles) == 0:
+            return None
+        
+        x, y, w, h = [int(v) for v in rectangles[0]]
+        return (y, x + w, y + h, x)
+    
+    def detect_emotion(self, image, use_ensemble=None, face_location=None):
         """
         Main detection dengan optional ensemble
-        use_ensemble=True: lebih stabil tapi lebih lambat
-        use_ensemble=False: lebih cepat
+        use_ensemble=None: pakai Config.EMOTION_ENSEMBLE_MODE ('off' / 'light' / 'full')
+        use_ensemble=True: 'full' (lebih stabil), False: 'off' (lebih cepat)
+        face_location: box (top, right, bottom, left) dari face recognition.
+            Jika ada, hanya ROI wajah yang diproses dan MTCNN tidak dijalankan
         """
         try:
             print(f"🎭 Detecting emotion...")
             
-            if use_ensemble:
-                # Ensemble: multiple detections dengan variasi
-                all_scores = []
-                
-                # 1. Original image
-                scores1 = self.detect_emotion_single(image)
-                if scores1:
-                    all_scores.append(scores1)
-                
-                # 2. Enhanced image
-                enhanced = self.preprocess_image(image)
-                scores2 = self.detect_emotion_single(enhanced)
-                if scores2:
-                    all_scores.append(scores2)
-                
-                # 3. Slightly brightened
-                brightened = cv2.convertScaleAbs(image, alpha=1.1, beta=10)
-                scores3 = self.detect_emotion_single(brightened)
-                if scores3:
-                    all_scores.append(scores3)
-                
-                if len(all_scores) == 0:
-                    return 'neutral', 60.0, '😐', 'Netral'
-                
-                # Average scores
-                avg_scores = {}
-                for emotion in all_scores[0].keys():
-                    avg_scores[emotion] = np.mean([s[emotion] for s in all_scores]) * 100
-                
-                emotion_scores = avg_scores
-                
+            if use_ensemble is None:
+                mode = Config.EMOTION_ENSEMBLE_MODE
             else:
-                # Single detection (faster)
-                emotion_scores = self.detect_emotion_single(image)
-                
-                if not emotion_scores:
+                mode = 'full' if use_ensemble else 'off'
+            
+            if face_location is None:
+                face_location = self.find_face_location(image)
+                if face_location is None:
                     return 'neutral', 60.0, '😐', 'Netral'
-                
-                # Convert to percentage
-                emotion_scores = {k: v * 100 for k, v in emotion_scores.items()}
+            
+            if len(image.shape) == 2:
+                image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
+            
+            roi, face_rectangle = self.crop_face(image, face_location)
+            
+            # Ensemble: semua variasi dalam satu batched forward pass
+            all_scores = self.classify_batch(
+                self.get_ensemble_variants(roi, mode),
+                face_rectangle
+            )
+            
+            if len(all_scores) == 0:
+                return 'neutral', 60.0, '😐', 'Netral'
+            
+            # Average scores (convert to percentage)
+            emotion_scores = {}
+            for emotion in all_scores[0].keys():
+                emotion_scores[emotion] = np.mean([s[emotion] for s in all_scores]) * 100
             
             print(f"📊 FER 7-emotion scores:")
             for emotion, score in sorted(emotion_scores.items(), key=lambda x: x[1], reverse=True):
@@ -0,0 +1,134 @@
+"""
+Process-level cache untuk face encodings
+Gallery dimuat sekali dari database, lalu hanya di-reload jika generation
+di tabel gallery_version berubah (misalnya ditulis oleh worker lain)
+Dengan GALLERY_SHARED_ENABLED, reload memetakan snapshot yang sudah dipublish
+worker lain (utils/shared_gallery.py) sebelum jatuh ke query database
+
+Gallery yang dikembalikan ke request tidak pernah diubah lagi: setiap update
+membangun gallery baru lalu mengganti self.gallery di bawah lock
+"""
+
+import threading
+from config import Config
+from models import FaceEncodingModel
+from utils.face_gallery import FaceGallery
+from utils.shared_gallery import SharedGalleryStore
+
+
+class EncodingCache:
+    def __init__(self, shared_store=None):
+        self.gallery = FaceGallery()
+        # None = belum dimuat atau perlu reload
+        self.generation = None
+        # Identitas database (gallery_version.epoch) untuk validasi snapshot shared
+        self.epoch = None
+        self.lock = threading.RLock()
+        
+        if shared_store is None and Config.GALLERY_SHARED_ENABLED:
+            shared_store = SharedGalleryStore()
+        self.shared_store = shared_store
+    
+    def get_gallery(self, db):
+        """
+        Return gallery terbaru. Per request hanya satu query kecil
+        (SELECT generation), tidak tergantung jumlah user terdaftar
+        """
+        face_model = FaceEncodingModel(db)
+        current = face_model.get_generation()
+        
+        with self.lock:
+            if self.generation != current and not self._map_shared(face_model, current):
+                self._reload(face_model, current)
+            return self.gallery
+    
+    def get_gallery_at(self, generation, get_db):
+        """
+        Sama dengan get_gallery, tetapi generation sudah dibaca di luar
+        (misalnya lewat driver async). Koneksi sync hanya dipinjam saat generation berubah
+        """
+        with self.lock:
+            if self.generation != generation:
+                with get_db() as db:
+                    face_model = FaceEncodingModel(db)
+                    if not self._map_shared(face_model, generation):
+                        self._reload(face_model, generation)
+            return self.gallery
+    
+    def load(self, db):
+        """Load penuh dari database (dipanggil saat startup)"""
+        face_model = FaceEncodingModel(db)
+        with self.lock:
+            generation = face_model.get_generation()
+            if not self._map_shared(face_model, generation):
+                self._reload(face_model, generation)
+        return self.gallery
+    
+    def _reload(self, face_model, generation):
+        # Generation dibaca SEBELUM data, jadi jika ada write di antaranya
+        # request berikutnya hanya akan reload sekali lagi (aman)
+        self.epoch = face_model.get_epoch()
+        records = face_model.get_all_encodings()
+        self.gallery = FaceGallery.from_records(records, centroids=face_model.get_all_centroids())
+        self.generation = generation
+        print(f"📦 Encoding cache loaded: {self.gallery.num_users} users, "
+              f"{len(self.gallery)} encodings (generation {generation})")
+        self._publish()
+    
+    def _map_shared(self, face_model, generation):
+        """
+        Pakai snapshot shared untuk generation ini jika ada dan epoch-nya sama
+        dengan database saat ini. Returns True jika berhasil
+        """
+        if self.shared_store is None:
+            return False
+        # Dibaca ulang setiap generation berubah: database bisa sudah di-reset
+        epoch = face_model.get_epoch()
+        gallery = self.shared_store.load(generation, epoch)
+        if gallery is None:
+            return False
+        self.gallery = gallery
+        self.generation = generation
+        self.epoch = epoch
+        return True
+    
+    def _publish(self):
+        # Worker lain dengan generation yang sama cukup map snapshot ini
+        if self.shared_store is not None and self.generation is not None:
+            self.shared_store.publish(self.gallery, self.generation, self.epoch)
+    
+    def add_user(self, user_data, encodings, generation, centroid=None):
+        """Update incremental setelah register_user. centroid: (centroid, spread) yang disimpan"""
+        with self.lock:
+            self.gallery = self.gallery.with_user(user_data, encodings, centroid)
+            self._advance(generation)
+            self._publish()
+    
+    def remove_user(self, user_id, generation):
+        """Update incremental setelah delete_user"""
+        with self.lock:
+            self.gallery = self.gallery.without_user(user_id)
+            self._advance(generation)
+            self._publish()
+    
+    def _advance(self, generation):
+        # Jika generation naik tepat satu, tidak ada worker lain yang menulis
+        # sejak load terakhir. Selain itu tandai stale agar reload penuh.
+        if self.generation is not None and generation == self.generation + 1:
+            self.generation = generation
+        else:
+            self.generation = None
+    
+    def invalidate(self):
+        with self.lock:
+            self.generation = None
+    
+    def get_stats(self):
+        with self.lock:
+            stats = {
+                'generation': self.generation,
+                'users': self.gallery.num_users,
+                'encodings': len(self.gallery)
+            }
+        stats['shared'] = self.shared_store.get_stats() if self.shared_store is not None else None
+        return stats
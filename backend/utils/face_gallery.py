@@ -0,0 +1,405 @@
+"""
+Resident face gallery untuk matching cepat
+Semua encoding disimpan dalam satu matrix float32 (N, 128) + array index user,
+sehingga satu check-in cukup satu kali perhitungan jarak (batched)
+
+Gallery yang sudah dipakai request tidak pernah diubah: with_user / without_user
+membangun instance baru, EncodingCache lalu mengganti referensinya di bawah lock
+"""
+
+import copy
+import numpy as np
+from config import Config
+from utils.face_index import create_index
+
+ENCODING_DIM = 128
+
+# Bobot scoring (harus sama dengan compare_faces): Min=50%, Avg=30%, Median=20%
+WEIGHT_MIN = 0.5
+WEIGHT_AVG = 0.3
+WEIGHT_MEDIAN = 0.2
+
+
+
+def compute_centroid(encodings):
+    """
+    Centroid + spread (jarak maksimum encoding ke centroid) untuk satu user
+    Returns: (centroid float32 (128,), spread float)
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+    centroid = encodings.astype(np.float64).mean(axis=0)
+    spread = float(np.linalg.norm(encodings - centroid, axis=1).max())
+    return centroid.astype(np.float32), spread
+
+
+class FaceGallery:
+    def __init__(self, index=None, prefilter_top_k=None):
+        # Index kandidat (brute force / IVF), lihat utils/face_index.py
+        self.index = index if index is not None else create_index()
+        # Jumlah user yang di-shortlist lewat centroid (0 = nonaktif)
+        self.prefilter_top_k = Config.FACE_PREFILTER_TOP_K if prefilter_top_k is None else prefilter_top_k
+        self._clear()
+    
+    def _clear(self):
+        # Matrix encoding, baris dikelompokkan per user (contiguous)
+        self.matrix = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        # user_index[i] = posisi user (di self.users) untuk baris i
+        self.user_index = np.empty(0, dtype=np.int64)
+        # Data user (id, nama, nim) sesuai urutan kemunculan pertama
+        self.users = []
+        # user_id -> posisi di self.users
+        self.positions = {}
+        # Awal dan jumlah baris untuk setiap user
+        self.offsets = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        # ||e||^2 per baris (float64) untuk distance via satu matrix-vector product
+        self.sq_norms = np.empty(0, dtype=np.float64)
+        # padded_rows[u, j] = baris ke-j milik user u (dipadding dengan baris terakhir user)
+        self.padded_rows = np.empty((0, 0), dtype=np.int64)
+        # Centroid per user + spread (jarak maksimum encoding ke centroid)
+        self.centroids = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self.centroid_sq_norms = np.empty(0, dtype=np.float64)
+        self.spreads = np.empty(0, dtype=np.float64)
+    
+    @classmethod
+    def from_records(cls, known_encodings, index=None, prefilter_top_k=None, centroids=None):
+        """
+        Build gallery dari hasil FaceEncodingModel.get_all_encodings()
+        centroids: hasil FaceEncodingModel.get_all_centroids() (opsional)
+        """
+        gallery = cls(index=index, prefilter_top_k=prefilter_top_k)
+        grouped = {}
+        order = []
+        
+        for enc_data in known_encodings:
+            user_id = enc_data['user_id']
+            if user_id not in grouped:
+                grouped[user_id] = {'user_data': enc_data, 'encodings': []}
+                order.append(user_id)
+            grouped[user_id]['encodings'].append(enc_data['encoding'])
+        
+        gallery._build(
+            [grouped[uid]['user_data'] for uid in order],
+            [grouped[uid]['encodings'] for uid in order],
+            centroids
+        )
+        gallery.rebuild_index()
+        return gallery
+    
+    @classmethod
+    def from_matrix(cls, matrix, users, counts, index=None, prefilter_top_k=None):
+        """
+        Build gallery dari matrix (N, 128) yang barisnya sudah dikelompokkan per user
+        (counts[i] > 0 baris untuk users[i]). Matrix dipakai langsung tanpa copy,
+        misalnya hasil np.load(mmap_mode='r') dari SharedGalleryStore.
+        Centroid dihitung dari matrix (nilainya sama dengan yang tersimpan)
+        """
+        gallery = cls(index=index, prefilter_top_k=prefilter_top_k)
+        counts = np.asarray(counts, dtype=np.int64)
+        
+        if len(users) > 0:
+            gallery._set_rows(matrix, list(users), counts)
+        
+        gallery.rebuild_index()
+        return gallery
+    
+    def _build(self, users, encodings_per_user, centroids=None):
+        """Susun ulang matrix contiguous dari list user + encoding"""
+        # User tanpa encoding tidak ikut di-match
+        pairs = [(u, encs) for u, encs in zip(users, encodings_per_user) if len(encs) > 0]
+        
+        if not pairs:
+            self._clear()
+            return
+        
+        users = [u for u, _ in pairs]
+        counts = np.array([len(encs) for _, encs in pairs], dtype=np.int64)
+        
+        matrix = np.ascontiguousarray(
+            np.vstack([np.asarray(encs, dtype=np.float32).reshape(-1, ENCODING_DIM)
+                       for _, encs in pairs]),
+            dtype=np.float32
+        )
+        self._set_rows(matrix, users, counts, centroids)
+    
+    def _set_rows(self, matrix, users, counts, centroids=None):
+        """
+        Pasang matrix (baris sudah dikelompokkan per user, tanpa copy) + hitung array turunannya
+        centroids: user_id -> (centroid, spread, num_encodings) yang sudah ada; user lain
+        (atau yang jumlah encoding-nya berbeda) dihitung dari matrix
+        """
+        self.matrix = matrix
+        self.counts = counts
+        self.offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64)
+        self.user_index = np.repeat(np.arange(len(users), dtype=np.int64), counts)
+        self.users = [
+            {'user_id': u['user_id'], 'nama': u['nama'], 'nim': u['nim']}
+            for u in users
+        ]
+        self.positions = {u['user_id']: pos for pos, u in enumerate(self.users)}
+        self.sq_norms = np.einsum('ij,ij->i', self.matrix, self.matrix, dtype=np.float64)
+        
+        slots = np.arange(counts.max())
+        self.padded_rows = self.offsets[:, None] + np.minimum(slots[None, :], counts[:, None] - 1)
+        
+        self.centroids = np.empty((len(self.users), ENCODING_DIM), dtype=np.float32)
+        self.spreads = np.empty(len(self.users), dtype=np.float64)
+        missing = np.ones(len(self.users), dtype=bool)
+        
+        stored = centroids or {}
+        for pos, user in enumerate(self.users):
+            entry = stored.get(user['user_id'])
+            if entry is not None and entry[2] == counts[pos]:
+                self.centroids[pos] = entry[0]
+                self.spreads[pos] = entry[1]
+                missing[pos] = False
+        
+        if missing.any():
+            # User tanpa centroid tersimpan (legacy / snapshot shared): satu pass reduceat
+            computed = np.add.reduceat(self.matrix.astype(np.float64), self.offsets, axis=0) / counts[:, None]
+            row_spread = np.linalg.norm(self.matrix - computed[self.user_index], axis=1)
+            self.centroids[missing] = computed[missing]
+            self.spreads[missing] = np.maximum.reduceat(row_spread, self.offsets)[missing]
+        
+        self.centroid_sq_norms = np.einsum('ij,ij->i', self.centroids, self.centroids, dtype=np.float64)
+    
+    def rebuild_index(self):
+        """(Re)train index dari seluruh isi gallery"""
+        user_ids = np.array([u['user_id'] for u in self.users], dtype=np.int64)
+        self.index.build(self.matrix, user_ids[self.user_index])
+    
+    def _derive(self):
+        """Gallery kosong dengan setting + copy index yang sama"""
+        return type(self)(index=copy.deepcopy(self.index), prefilter_top_k=self.prefilter_top_k)
+    
+    def _stored_centroids(self, exclude_user_id=None):
+        """Centroid yang sudah ada per user_id, agar tidak dihitung ulang saat rebuild"""
+        return {
+            user['user_id']: (self.centroids[pos], self.spreads[pos], self.counts[pos])
+            for pos, user in enumerate(self.users)
+            if user['user_id'] != exclude_user_id
+        }
+    
+    def with_user(self, user_data, encodings, centroid=None):
+        """
+        Gallery baru: isi gallery ini + (atau ganti) encoding satu user
+        centroid: (centroid, spread) dari registrasi, None = dihitung dari encodings
+        """
+        user_id = user_data.get('user_id', user_data.get('id'))
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM)
+        
+        replaced = user_id in self.positions
+        
+        users, per_user = self._grouped(exclude_user_id=user_id)
+        users.append({'user_id': user_id, 'nama': user_data['nama'], 'nim': user_data['nim']})
+        per_user.append(encodings)
+        
+        centroids = self._stored_centroids(exclude_user_id=user_id)
+        if centroid is not None:
+            centroids[user_id] = (centroid[0], centroid[1], len(encodings))
+        
+        gallery = self._derive()
+        gallery._build(users, per_user, centroids)
+        
+        if replaced:
+            gallery.index.remove(user_id)
+        if len(encodings) > 0:
+            gallery.index.add(user_id, encodings)
+        
+        if getattr(gallery.index, 'needs_retrain', lambda: False)():
+            gallery.rebuild_index()
+        return gallery
+    
+    def without_user(self, user_id):
+        """Gallery baru tanpa encoding milik user_id (self jika user tidak ada)"""
+        if user_id not in self.positions:
+            return self
+        
+        users, per_user = self._grouped(exclude_user_id=user_id)
+        gallery = self._derive()
+        gallery._build(users, per_user, self._stored_centroids(exclude_user_id=user_id))
+        gallery.index.remove(user_id)
+        return gallery
+    
+    def _grouped(self, exclude_user_id=None):
+        """Pecah matrix kembali menjadi list (user, encodings) per user"""
+        users = []
+        per_user = []
+        for pos, user in enumerate(self.users):
+            if user['user_id'] == exclude_user_id:
+                continue
+            start = self.offsets[pos]
+            users.append(user)
+            per_user.append(self.matrix[start:start + self.counts[pos]])
+        return users, per_user
+    
+    def __len__(self):
+        return self.matrix.shape[0]
+    
+    @property
+    def num_users(self):
+        return len(self.users)
+    
+    def distances(self, face_encoding, rows=None):
+        """
+        Euclidean distance query ke setiap baris (atau subset rows) dalam satu
+        matrix-vector product: ||e - q||^2 = ||e||^2 - 2 e.q + ||q||^2
+        """
+        query = np.asarray(face_encoding, dtype=np.float64).reshape(ENCODING_DIM)
+        
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        sq_norms = self.sq_norms if rows is None else self.sq_norms[rows]
+        
+        sq = sq_norms - 2.0 * (matrix @ query.astype(np.float32)) + query @ query
+        return np.sqrt(np.maximum(sq, 0.0))
+    
+    def batch_distances(self, face_encodings):
+        """Distance Q query ke semua baris dalam satu matrix-matrix product -> (Q, N)"""
+        queries = np.asarray(face_encodings, dtype=np.float64).reshape(-1, ENCODING_DIM)
+        
+        sq = (self.sq_norms[None, :]
+              - 2.0 * (queries.astype(np.float32) @ self.matrix.T)
+              + np.einsum('ij,ij->i', queries, queries)[:, None])
+        return np.sqrt(np.maximum(sq, 0.0))
+    
+    def score(self, face_encoding, positions=None):
+        """
+        Hitung combined distance untuk setiap user dengan satu operasi batched
+        positions: subset posisi user (urut naik), None = semua user
+        Returns: (combined, min_dist, avg_dist, median_dist) masing-masing array
+        sepanjang jumlah user yang di-score
+        """
+        if positions is None or len(positions) == self.num_users:
+            # Satu kali perhitungan jarak untuk semua encoding
+            return self._reduce(self.distances(face_encoding), self.padded_rows, self.counts)
+        
+        # Hanya baris milik user kandidat, padding dihitung ulang relatif ke subset
+        counts = self.counts[positions]
+        local_offsets = np.cumsum(counts) - counts
+        rows = np.repeat(self.offsets[positions], counts) + (
+            np.arange(counts.sum()) - np.repeat(local_offsets, counts)
+        )
+        slots = np.arange(counts.max())
+        padded = local_offsets[:, None] + np.minimum(slots[None, :], counts[:, None] - 1)
+        
+        return self._reduce(self.distances(face_encoding, rows), padded, counts)
+    
+    @staticmethod
+    def _reduce(distances, padded_rows, counts):
+        """
+        Grouped min/mean/median per user via matrix (users x max_encodings)
+        distances boleh (N,) untuk satu query atau (Q, N) untuk batch
+        """
+        grouped = distances[..., padded_rows]
+        valid = np.arange(padded_rows.shape[1])[None, :] < counts[:, None]
+        
+        # Slot padding diisi +inf agar selalu di belakang setelah sort
+        sorted_dist = np.sort(np.where(valid, grouped, np.inf), axis=-1)
+        users = np.arange(len(counts))
+        
+        min_dist = sorted_dist[..., 0]
+        avg_dist = np.where(valid, grouped, 0.0).sum(axis=-1) / counts
+        
+        # Median: rata-rata dua elemen tengah (sama dengan np.median)
+        lower = sorted_dist[..., users, (counts - 1) // 2]
+        upper = sorted_dist[..., users, counts // 2]
+        median_dist = (lower + upper) / 2.0
+        
+        combined = (min_dist * WEIGHT_MIN) + (avg_dist * WEIGHT_AVG) + (median_dist * WEIGHT_MEDIAN)
+        
+        return combined, min_dist, avg_dist, median_dist
+    
+    def candidate_positions(self, face_encoding):
+        """Posisi user kandidat dari index (None = semua user)"""
+        candidate_ids = self.index.candidates(face_encoding)
+        
+        if candidate_ids is None:
+            return None
+        
+        positions = sorted(self.positions[uid] for uid in candidate_ids.tolist() if uid in self.positions)
+        
+        # Index tidak menemukan kandidat -> fallback ke full scan
+        if not positions:
+            return None
+        
+        return np.array(positions, dtype=np.int64)
+    
+    def centroid_distances(self, face_encoding, positions):
+        """Distance query ke centroid user (subset positions)"""
+        query = np.asarray(face_encoding, dtype=np.float64).reshape(ENCODING_DIM)
+        sq = (self.centroid_sq_norms[positions]
+              - 2.0 * (self.centroids[positions] @ query.astype(np.float32))
+              + query @ query)
+        return np.sqrt(np.maximum(sq, 0.0))
+    
+    def prefiltered_score(self, face_encoding, positions, top_k):
+        """
+        Centroid pass -> full scoring hanya untuk shortlist top_k user.
+        Ranking memakai d(q, centroid_u) - spread_u: batas bawah jarak query ke
+        encoding terdekat user u, jadi user dengan spread besar tidak terlewat.
+        Work per check: satu pass centroid + encoding top_k user (bukan semua encoding)
+        positions harus urut naik (begitu juga hasilnya)
+        Returns: (positions, combined, min_dist, avg_dist, median_dist)
+        """
+        lower_bound = self.centroid_distances(face_encoding, positions) - self.spreads[positions]
+        
+        # Urut posisi -> tie-break sama dengan full scan
+        shortlist = np.sort(positions[np.argpartition(lower_bound, top_k - 1)[:top_k]])
+        return (shortlist,) + self.score(face_encoding, shortlist)
+    
+    def best_match(self, face_encoding):
+        """
+        Cari user dengan combined distance terkecil
+        Returns: (user_data, combined, min_dist, avg_dist, median_dist) atau None jika kosong
+        """
+        if len(self) == 0:
+            return None
+        
+        positions = self.candidate_positions(face_encoding)
+        num_candidates = self.num_users if positions is None else len(positions)
+        top_k = self.prefilter_top_k
+        
+        if top_k and num_candidates > 2 * top_k:
+            if positions is None:
+                positions = np.arange(self.num_users)
+            positions, combined, min_dist, avg_dist, median_dist = self.prefiltered_score(
+                face_encoding, positions, top_k
+            )
+        else:
+            combined, min_dist, avg_dist, median_dist = self.score(face_encoding, positions)
+        
+        # argmin mengambil kemunculan pertama -> tie-break sama dengan loop lama
+        best = int(np.argmin(combined))
+        user = self.users[best if positions is None else int(positions[best])]
+        
+        return (
+            user,
+            float(combined[best]),
+            float(min_dist[best]),
+            float(avg_dist[best]),
+            float(median_dist[best])
+        )
+    
+    def best_matches(self, face_encodings):
+        """
+        Versi batch dari best_match untuk banyak wajah sekaligus (satu GEMM, tanpa index)
+        Returns: list (user_data, combined, min_dist, avg_dist, median_dist) per query
+        """
+        if len(self) == 0 or len(face_encodings) == 0:
+            return [None] * len(face_encodings)
+        
+        combined, min_dist, avg_dist, median_dist = self._reduce(
+            self.batch_distances(face_encodings), self.padded_rows, self.counts
+        )
+        best = np.argmin(combined, axis=1)
+        
+        return [
+            (
+                self.users[int(b)],
+                float(combined[q, b]),
+                float(min_dist[q, b]),
+                float(avg_dist[q, b]),
+                float(median_dist[q, b])
+            )
+            for q, b in enumerate(best)
+        ]
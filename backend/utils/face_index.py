@@ -0,0 +1,146 @@
+"""
+Index untuk mempersempit kandidat user sebelum scoring di FaceGallery
+- BruteForceIndex: semua user jadi kandidat (default, hasil exact)
+- IVFIndex: encoding dipartisi dengan k-means, hanya partisi terdekat yang di-scan
+"""
+
+import numpy as np
+from config import Config
+
+
+class BruteForceIndex:
+    name = 'brute'
+    
+    def build(self, matrix, user_ids):
+        pass
+    
+    def add(self, user_id, encodings):
+        pass
+    
+    def remove(self, user_id):
+        pass
+    
+    def candidates(self, query):
+        # None = scan semua user
+        return None
+
+
+class IVFIndex:
+    """
+    Inverted file index (pure NumPy)
+    Setiap encoding masuk ke satu partisi (centroid k-means terdekat).
+    Query hanya memeriksa nprobe partisi terdekat, lalu semua encoding milik
+    user kandidat di-score secara exact oleh FaceGallery.
+    """
+    name = 'ivf'
+    
+    def __init__(self, nlist=0, nprobe=8, iterations=10, seed=0):
+        # nlist=0 -> otomatis sqrt(N)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.seed = seed
+        
+        self.centroids = None
+        # lists[k] = array user_id untuk setiap encoding di partisi k
+        self.lists = []
+        self.trained_size = 0
+        self.size = 0
+    
+    def build(self, matrix, user_ids):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        user_ids = np.asarray(user_ids)
+        self.size = matrix.shape[0]
+        
+        if self.size == 0:
+            self.centroids = None
+            self.lists = []
+            self.trained_size = 0
+            return
+        
+        nlist = self.nlist or int(np.sqrt(self.size))
+        nlist = max(1, min(nlist, self.size))
+        
+        self.centroids = self._kmeans(matrix, nlist)
+        self.trained_size = self.size
+        
+        assignments = self._assign(matrix)
+        self.lists = [user_ids[assignments == k] for k in range(nlist)]
+    
+    def _kmeans(self, matrix, nlist):
+        """Lloyd's k-means sederhana, init dari sampel acak"""
+        rng = np.random.default_rng(self.seed)
+        centroids = matrix[rng.choice(matrix.shape[0], nlist, replace=False)].copy()
+        
+        for _ in range(self.iterations):
+            assignments = self._nearest(matrix, centroids)
+            
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, matrix)
+            counts = np.bincount(assignments, minlength=nlist)
+            
+            # Partisi kosong: pertahankan centroid lama
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        
+        return centroids
+    
+    @staticmethod
+    def _nearest(matrix, centroids):
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2 (||x||^2 konstan per baris)
+        scores = (centroids ** 2).sum(axis=1) - 2.0 * (matrix @ centroids.T)
+        return np.argmin(scores, axis=1)
+    
+    def _assign(self, matrix):
+        return self._nearest(np.asarray(matrix, dtype=np.float32), self.centroids)
+    
+    def add(self, user_id, encodings):
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self._dim())
+        
+        if self.centroids is None:
+            self.build(encodings, np.full(encodings.shape[0], user_id))
+            return
+        
+        for k in self._assign(encodings):
+            self.lists[k] = np.append(self.lists[k], user_id)
+        self.size += encodings.shape[0]
+    
+    def remove(self, user_id):
+        removed = 0
+        for k, ids in enumerate(self.lists):
+            keep = ids != user_id
+            removed += int((~keep).sum())
+            self.lists[k] = ids[keep]
+        self.size -= removed
+    
+    def needs_retrain(self):
+        # Centroid dilatih ulang jika gallery sudah tumbuh 2x sejak training
+        return self.size > 2 * max(self.trained_size, 1)
+    
+    def candidates(self, query):
+        if self.centroids is None:
+            return None
+        
+        query = np.asarray(query, dtype=np.float32).reshape(1, -1)
+        distances = ((self.centroids - query) ** 2).sum(axis=1)
+        
+        nprobe = min(self.nprobe, len(self.lists))
+        probe = np.argpartition(distances, nprobe - 1)[:nprobe]
+        
+        return np.unique(np.concatenate([self.lists[k] for k in probe]))
+    
+    def _dim(self):
+        return self.centroids.shape[1] if self.centroids is not None else 128
+
+
+def create_index(index_type=None):
+    """Buat index sesuai Config.FACE_INDEX_TYPE ('brute' atau 'ivf')"""
+    index_type = (index_type or Config.FACE_INDEX_TYPE).lower()
+    
+    if index_type == 'ivf':
+        return IVFIndex(nlist=Config.FACE_INDEX_NLIST, nprobe=Config.FACE_INDEX_NPROBE)
+    
+    if index_type != 'brute':
+        print(f"⚠️ Unknown FACE_INDEX_TYPE '{index_type}', using brute force")
+    
+    return BruteForceIndex()
@@ -1,10 +1,129 @@
-import face_recognition
 import numpy as np
 import cv2
 from PIL import Image
 import io
 import base64
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from config import Config
+from utils.face_gallery import FaceGallery
+from utils.startup import LazyModule
+
+# Model dlib (detector, landmark, encoder ~100MB) baru di-load saat pertama dipakai
+# atau saat warm-up, bukan saat import
+face_recognition = LazyModule('face_recognition')
+face_recognition_api = LazyModule('face_recognition.api')
+dlib = LazyModule('dlib')
+
+# Process pool untuk registrasi (dlib CPU-bound), dibuat sekali dan dipakai ulang
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+# Handler di dalam worker process (dibuat oleh initializer)
+_worker_handler = None
+
+def _init_pool_worker():
+    global _worker_handler
+    _worker_handler = FaceRecognitionHandler()
+
+def _detect_frame_in_worker(args):
+    image, profile = args
+    return _worker_handler.detect_frame(image, profile)
+
+def _encode_frame_in_worker(args):
+    image, face_location, profile = args
+    return _worker_handler.encode_frame(image, face_location, profile)
+
+def _analyze_frame_in_worker(args):
+    image_data, = args
+    return _worker_handler.analyze_frame(image_data)
+
+def _prepare_checkin_in_worker(args):
+    image_data, = args
+    return _worker_handler.prepare_checkin(image_data)
+
+def _pool_context():
+    """
+    Worker dibuat dari forkserver (spawn jika tidak tersedia), bukan fork dari
+    process app: thread warm-up bisa sedang memegang lock LazyModule / import
+    (dan TensorFlow tidak fork-safe), sehingga child hasil fork bisa deadlock
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context('forkserver')
+        # Server single-threaded meng-import face_recognition (model dlib) sekali,
+        # semua worker mewarisinya copy-on-write
+        ctx.set_forkserver_preload(['face_recognition'])
+        return ctx
+    return multiprocessing.get_context('spawn')
+
+def get_process_pool():
+    """Persistent process pool, worker + model dlib hanya di-load sekali"""
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=Config.MAX_WORKERS,
+                    mp_context=_pool_context(),
+                    initializer=_init_pool_worker
+                )
+    return _process_pool
+
+def _reset_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+# Interpolasi resize: nama config -> (PIL resample, cv2 flag)
+RESIZE_INTERPOLATION = {
+    'lanczos': (Image.LANCZOS, cv2.INTER_LANCZOS4),
+    'area': (Image.BOX, cv2.INTER_AREA),
+    'bilinear': (Image.BILINEAR, cv2.INTER_LINEAR),
+    'nearest': (Image.NEAREST, cv2.INTER_NEAREST),
+}
+
+# Flag decode JPEG pada 1/2, 1/4, 1/8 resolusi (libjpeg DCT scaling)
+CV2_REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def hamming_distance(a, b):
+    """Jumlah bit berbeda antara dua perceptual hash (int)"""
+    return bin(a ^ b).count('1')
+
+def image_dhash(image):
+    """Difference hash 64-bit (9x8) untuk deteksi gambar hampir identik"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+    tiny = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (tiny[:, 1:] > tiny[:, :-1]).flatten()
+    return int(np.packbits(bits).view('>u8')[0])
+
+def _interpolation(fast):
+    """fast=True untuk frame check-in (detection + encoding), False untuk registrasi"""
+    name = Config.IMAGE_FAST_INTERPOLATION if fast else Config.IMAGE_RESIZE_INTERPOLATION
+    return RESIZE_INTERPOLATION.get(name.lower(), RESIZE_INTERPOLATION['lanczos'])
+
+def _target_size(size, max_size):
+    """(width, height) setelah sisi terpanjang dibatasi max_size, None jika tidak perlu resize"""
+    width, height = size
+    if max(width, height) <= max_size:
+        return None
+    ratio = max_size / max(width, height)
+    return max(1, int(width * ratio)), max(1, int(height * ratio))
+
+def _reduced_factor(size, max_size):
+    """Faktor reduksi decode terbesar (1/2/4/8) yang hasilnya masih >= max_size"""
+    longest = max(size)
+    for factor in (8, 4, 2):
+        if longest // factor >= max_size:
+            return factor
+    return 1
 
 class FaceRecognitionHandler:
     def __init__(self):
@@ -12,8 +131,22 @@ class FaceRecognitionHandler:
         # 0.5-0.6 = optimal untuk most cases
         self.tolerance = 0.55  # Lebih balance
         
-    def base64_to_image(self, base64_string):
-        """Convert base64 string to numpy array image"""
+        # Profile detection/encoding (lihat Config.FACE_PROFILES)
+        self.enroll_profile = Config.get_face_profile('enroll')
+        self.checkin_profile = Config.get_face_profile('checkin')
+        
+    def warm_up(self):
+        """Load model dlib + dummy inference (deteksi HOG, landmark, encoder)"""
+        dummy = np.zeros((160, 160, 3), dtype=np.uint8)
+        face_recognition.face_locations(dummy, number_of_times_to_upsample=0)
+        face_recognition.face_encodings(dummy, [(20, 140, 140, 20)], num_jitters=1)
+    
+    def base64_to_image(self, base64_string, fast=False):
+        """
+        Convert base64 string to numpy array image
+        Sisi terpanjang dibatasi Config.MAX_IMAGE_SIZE; JPEG besar di-decode
+        langsung pada resolusi lebih kecil via draft()
+        """
         try:
             if ',' in base64_string:
                 base64_string = base64_string.split(',')[1]
@@ -21,12 +154,16 @@ class FaceRecognitionHandler:
             image_bytes = base64.b64decode(base64_string)
             image = Image.open(io.BytesIO(image_bytes))
             
-            # Resize jika terlalu besar (speed optimization)
-            max_size = 1024
-            if max(image.size) > max_size:
-                ratio = max_size / max(image.size)
-                new_size = tuple(int(dim * ratio) for dim in image.size)
-                image = image.resize(new_size, Image.LANCZOS)
+            target_size = _target_size(image.size, Config.MAX_IMAGE_SIZE)
+            if target_size and image.format == 'JPEG':
+                # Decoder memilih skala 1/2, 1/4 atau 1/8 yang masih >= target
+                image.draft('RGB', target_size)
+            
+            # Resize sisa skala ke ukuran target (speed optimization)
+            target_size = _target_size(image.size, Config.MAX_IMAGE_SIZE)
+            if target_size:
+                resample, _ = _interpolation(fast)
+                image = image.resize(target_size, resample)
             
             if image.mode != 'RGB':
                 image = image.convert('RGB')
@@ -38,6 +175,54 @@ class FaceRecognitionHandler:
             print(f"❌ Error converting base64: {e}")
             return None
     
+    def bytes_to_image(self, image_bytes, fast=False):
+        """
+        Decode raw JPEG/PNG bytes (upload multipart / raw body) langsung ke numpy RGB
+        via cv2.imdecode, tanpa lewat base64 + PIL
+        JPEG besar di-decode pada 1/2, 1/4 atau 1/8 resolusi (IMREAD_REDUCED_COLOR_*)
+        """
+        try:
+            buffer = np.frombuffer(image_bytes, dtype=np.uint8)
+            
+            # Ukuran asli dibaca dari header saja (PIL lazy, belum decode pixel)
+            flag = cv2.IMREAD_COLOR
+            try:
+                header = Image.open(io.BytesIO(image_bytes))
+                if header.format == 'JPEG':
+                    factor = _reduced_factor(header.size, Config.MAX_IMAGE_SIZE)
+                    flag = CV2_REDUCED_FLAGS.get(factor, cv2.IMREAD_COLOR)
+            except Exception:
+                # Format yang tidak dikenal PIL tetap dicoba oleh cv2
+                pass
+            
+            image = cv2.imdecode(buffer, flag)
+            
+            if image is None:
+                print("❌ Error decoding image bytes: format tidak dikenali")
+                return None
+            
+            # Resize sisa skala ke Config.MAX_IMAGE_SIZE (speed optimization)
+            height, width = image.shape[:2]
+            target_size = _target_size((width, height), Config.MAX_IMAGE_SIZE)
+            if target_size:
+                _, interpolation = _interpolation(fast)
+                image = cv2.resize(image, target_size, interpolation=interpolation)
+            
+            return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            
+        except Exception as e:
+            print(f"❌ Error decoding image bytes: {e}")
+            return None
+    
+    def decode_image(self, image_data, fast=False):
+        """
+        Decode gambar dari request: bytes (upload) atau string base64 (JSON)
+        fast=True memakai Config.IMAGE_FAST_INTERPOLATION untuk resize
+        """
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            return self.bytes_to_image(image_data, fast=fast)
+        return self.base64_to_image(image_data, fast=fast)
+    
     def enhance_image_quality(self, image):
         """Enhance image untuk face detection lebih baik"""
         try:
@@ -55,134 +240,216 @@ class FaceRecognitionHandler:
         except:
             return image
     
-    def detect_face(self, image):
-        """Detect face dengan preprocessing"""
+    @staticmethod
+    def _locate(image, profile):
+        return face_recognition.face_locations(
+            image,
+            number_of_times_to_upsample=profile['upsample'],
+            model=profile['detection_model']
+        )
+    
+    @staticmethod
+    def downscale_for_detection(image, max_size=None):
+        """
+        Salinan kecil untuk deteksi (HOG cost sebanding jumlah pixel)
+        Returns: (small_image, scale_y, scale_x), scale = full / small
+        """
+        max_size = Config.FACE_DETECTION_MAX_SIZE if max_size is None else max_size
+        height, width = image.shape[:2]
+        
+        if not max_size or max(height, width) <= max_size:
+            return image, 1.0, 1.0
+        
+        ratio = max_size / max(height, width)
+        small = cv2.resize(
+            image,
+            (max(1, int(width * ratio)), max(1, int(height * ratio))),
+            interpolation=cv2.INTER_AREA
+        )
+        return small, height / small.shape[0], width / small.shape[1]
+    
+    @staticmethod
+    def upscale_locations(face_locations, scale_y, scale_x, shape):
+        """Map box (top, right, bottom, left) dari salinan kecil ke resolusi penuh"""
+        height, width = shape[:2]
+        return [
+            (
+                max(0, int(round(top * scale_y))),
+                min(width, int(round(right * scale_x))),
+                min(height, int(round(bottom * scale_y))),
+                max(0, int(round(left * scale_x)))
+            )
+            for top, right, bottom, left in face_locations
+        ]
+    
+    def detect_faces(self, image, profile=None, max_size=None, fallback=None):
+        """
+        Detect semua wajah dengan preprocessing
+        Deteksi berjalan pada salinan kecil (Config.FACE_DETECTION_MAX_SIZE),
+        box dikembalikan dalam koordinat resolusi penuh
+        profile: hasil Config.get_face_profile(), default profile check-in
+        Returns: (face_locations urut dari yang terbesar, error)
+        """
+        profile = profile or self.checkin_profile
+        fallback = fallback or Config.FACE_DETECTION_FALLBACK
         try:
+            small, scale_y, scale_x = self.downscale_for_detection(image, max_size)
+            
             # Try dengan image asli dulu
-            face_locations = face_recognition.face_locations(image, model='hog')
+            face_locations = self._locate(small, profile)
             
-            # Jika gagal, coba dengan enhanced image
-            if len(face_locations) == 0:
-                enhanced = self.enhance_image_quality(image)
-                face_locations = face_recognition.face_locations(enhanced, model='hog')
+            # Jika gagal, coba dengan enhanced image (CLAHE hanya pada salinan kecil)
+            if len(face_locations) == 0 and fallback in ('clahe', 'full'):
+                face_locations = self._locate(self.enhance_image_quality(small), profile)
+            
+            face_locations = self.upscale_locations(face_locations, scale_y, scale_x, image.shape)
+            
+            # Wajah kecil/jauh bisa hilang saat downscale: ulang pada resolusi penuh
+            if len(face_locations) == 0 and fallback == 'full' and small is not image:
+                face_locations = self._locate(image, profile)
             
             if len(face_locations) == 0:
-                return None, "Tidak ada wajah terdeteksi. Pastikan wajah terlihat jelas."
-            
-            if len(face_locations) > 1:
-                # Pilih wajah terbesar (paling dekat ke kamera)
-                face_locations = sorted(
-                    face_locations, 
-                    key=lambda loc: (loc[2]-loc[0])*(loc[1]-loc[3]), 
-                    reverse=True
-                )
+                return [], "Tidak ada wajah terdeteksi. Pastikan wajah terlihat jelas."
+            
+            # Wajah terbesar (paling dekat ke kamera) di depan
+            face_locations = sorted(
+                face_locations, 
+                key=lambda loc: (loc[2]-loc[0])*(loc[1]-loc[3]), 
+                reverse=True
+            )
             
-            return face_locations[0], None
+            return face_locations, None
             
         except Exception as e:
             print(f"❌ Error detecting face: {e}")
-            return None, f"Error: {str(e)}"
+            return [], f"Error: {str(e)}"
+    
+    def detect_face(self, image, profile=None):
+        """Detect face dengan preprocessing (hanya wajah terbesar)"""
+        face_locations, error = self.detect_faces(image, profile)
+        
+        if error:
+            return None, error
+        
+        return face_locations[0], None
     
-    def encode_face(self, image, num_jitters=3):
+    def encode_face(self, image, profile=None):
         """
         Encode face dengan multiple jitters untuk akurasi lebih baik
-        num_jitters: 1=fast, 3=balanced, 5=accurate
+        num_jitters diambil dari profile: 1=fast, 3=balanced, 5=accurate
+        """
+        encoding, _, error = self.detect_and_encode(image, profile)
+        return encoding, error
+    
+    def detect_and_encode(self, image, profile=None):
+        """
+        Single-pass: detect face sekali lalu encode
+        Returns: (encoding, face_location, error)
+        face_location (top, right, bottom, left) bisa dipakai ulang oleh emotion detector
         """
+        profile = profile or self.checkin_profile
         try:
-            face_location, error = self.detect_face(image)
+            face_location, error = self.detect_face(image, profile)
             
             if error:
-                return None, error
+                return None, None, error
             
-            # OPTIMIZED: num_jitters=3 (balance speed & accuracy)
             encodings = face_recognition.face_encodings(
                 image, 
                 [face_location],
-                num_jitters=num_jitters
+                num_jitters=profile['num_jitters']
             )
             
             if len(encodings) == 0:
-                return None, "Gagal mengekstrak encoding wajah"
+                return None, None, "Gagal mengekstrak encoding wajah"
             
-            return encodings[0], None
+            return encodings[0], face_location, None
         except Exception as e:
             print(f"❌ Error encoding face: {e}")
-            return None, f"Error: {str(e)}"
+            return None, None, f"Error: {str(e)}"
+    
+    def detect_and_encode_all(self, image, profile=None):
+        """
+        Detect semua wajah lalu encode dengan satu panggilan face_encodings
+        Returns: (encodings, face_locations, error)
+        """
+        profile = profile or self.checkin_profile
+        try:
+            face_locations, error = self.detect_faces(image, profile)
+            
+            if error:
+                return [], [], error
+            
+            encodings = face_recognition.face_encodings(
+                image,
+                face_locations,
+                num_jitters=profile['num_jitters']
+            )
+            
+            if len(encodings) == 0:
+                return [], [], "Gagal mengekstrak encoding wajah"
+            
+            return encodings, face_locations, None
+        except Exception as e:
+            print(f"❌ Error encoding faces: {e}")
+            return [], [], f"Error: {str(e)}"
+    
+    def encode_faces_batch(self, images, face_locations, profile=None):
+        """
+        Encode satu wajah dari setiap image (image berbeda-beda) dengan satu
+        batched forward pass dlib (compute_face_descriptor versi list)
+        Landmark 5 titik, sama dengan default face_recognition.face_encodings
+        Returns: list encoding sesuai urutan images
+        """
+        profile = profile or self.checkin_profile
+        
+        batch_faces = []
+        for image, face_location in zip(images, face_locations):
+            detections = dlib.full_object_detections()
+            detections.append(face_recognition_api.pose_predictor_5_point(
+                image, face_recognition_api._css_to_rect(face_location)
+            ))
+            batch_faces.append(detections)
+        
+        try:
+            descriptors = face_recognition_api.face_encoder.compute_face_descriptor(
+                list(images), batch_faces, profile['num_jitters']
+            )
+            return [np.array(faces[0]) for faces in descriptors]
+        except (TypeError, RuntimeError) as e:
+            # dlib lama tanpa batch API: encode satu per satu
+            print(f"⚠️ Batched face descriptor unavailable, encoding sequentially: {e}")
+            return [
+                face_recognition.face_encodings(image, [face_location], num_jitters=profile['num_jitters'])[0]
+                for image, face_location in zip(images, face_locations)
+            ]
     
     def compare_faces(self, known_encodings, face_encoding):
         """
-        OPTIMIZED: Compare dengan multiple metrics
+        OPTIMIZED: Compare dengan multiple metrics (vectorized via FaceGallery)
+        known_encodings: FaceGallery atau list hasil get_all_encodings()
         Returns: (match, user_data, confidence)
         """
         try:
-            if not known_encodings or len(known_encodings) == 0:
+            if known_encodings is None or len(known_encodings) == 0:
                 return False, None, 0.0
             
-            # Group encodings by user
-            user_scores = {}
+            gallery = known_encodings
+            if not isinstance(gallery, FaceGallery):
+                gallery = FaceGallery.from_records(known_encodings)
             
-            for enc_data in known_encodings:
-                user_id = enc_data['user_id']
-                
-                if user_id not in user_scores:
-                    user_scores[user_id] = {
-                        'distances': [],
-                        'user_data': enc_data
-                    }
-                
-                # Calculate distance (lower = more similar)
-                distance = face_recognition.face_distance(
-                    [enc_data['encoding']], 
-                    face_encoding
-                )[0]
-                
-                user_scores[user_id]['distances'].append(distance)
+            # Satu batched distance + grouped min/mean/median untuk semua user
+            best_match, best_distance, min_dist, avg_dist, median_dist = gallery.best_match(face_encoding)
             
-            # Find best match using WEIGHTED scoring
-            best_match = None
-            best_score = -1
-            best_distance = float('inf')
+            matched, best_score = self._decide(best_distance)
             
-            for user_id, data in user_scores.items():
-                distances = np.array(data['distances'])
-                
-                # OPTIMIZED SCORING:
-                # 1. Min distance (best case)
-                min_dist = np.min(distances)
-                
-                # 2. Average distance (consistency)
-                avg_dist = np.mean(distances)
-                
-                # 3. Median distance (robust to outliers)
-                median_dist = np.median(distances)
-                
-                # Weighted score (lower = better)
-                # Min=50%, Avg=30%, Median=20%
-                combined_dist = (min_dist * 0.5) + (avg_dist * 0.3) + (median_dist * 0.2)
-                
-                # Convert to confidence (0-100%)
-                # Distance 0.0 = 100%, Distance 1.0 = 0%
-                confidence = max(0, (1 - combined_dist) * 100)
-                
-                print(f"User {data['user_data']['nama']}:")
-                print(f"  Min dist: {min_dist:.4f}")
-                print(f"  Avg dist: {avg_dist:.4f}")
-                print(f"  Median dist: {median_dist:.4f}")
-                print(f"  Combined: {combined_dist:.4f}")
-                print(f"  Confidence: {confidence:.1f}%")
-                
-                # Track best match
-                if combined_dist < best_distance:
-                    best_distance = combined_dist
-                    best_score = confidence
-                    best_match = data['user_data']
-            
-            # DECISION: Accept if distance <= tolerance
-            if best_distance <= self.tolerance:
-                # Boost confidence jika sangat yakin
-                if best_distance < 0.35:
-                    best_score = min(99, best_score + 10)
-                
+            print(f"Best candidate {best_match['nama']} ({gallery.num_users} users, {len(gallery)} encodings):")
+            print(f"  Min dist: {min_dist:.4f}")
+            print(f"  Avg dist: {avg_dist:.4f}")
+            print(f"  Median dist: {median_dist:.4f}")
+            print(f"  Combined: {best_distance:.4f}")
+            
+            if matched:
                 print(f"\n✅ MATCH: {best_match['nama']}")
                 print(f"   Distance: {best_distance:.4f} (tolerance: {self.tolerance})")
                 print(f"   Confidence: {best_score:.1f}%\n")
@@ -199,83 +466,322 @@ class FaceRecognitionHandler:
             print(f"❌ Error comparing faces: {e}")
             return False, None, 0.0
     
-    def process_multiple_images(self, base64_images):
-        """Process multiple images dengan quality filtering"""
-        encodings = []
-        quality_scores = []
+    def _decide(self, best_distance):
+        """Returns: (match, confidence 0-100) untuk combined distance terbaik"""
+        # Convert to confidence (0-100%)
+        # Distance 0.0 = 100%, Distance 1.0 = 0%
+        best_score = max(0, (1 - best_distance) * 100)
         
-        print(f"\n{'='*60}")
-        print(f"📸 Processing {len(base64_images)} images...")
-        print(f"{'='*60}\n")
+        # DECISION: Accept if distance <= tolerance
+        if best_distance <= self.tolerance:
+            # Boost confidence jika sangat yakin
+            if best_distance < 0.35:
+                best_score = min(99, best_score + 10)
+            return True, best_score
         
-        for idx, base64_img in enumerate(base64_images):
-            print(f"Image {idx + 1}/{len(base64_images)}...")
-            
-            image = self.base64_to_image(base64_img)
-            if image is None:
-                print(f"❌ Failed to convert")
-                continue
+        return False, best_score
+    
+    def compare_faces_batch(self, gallery, face_encodings):
+        """
+        Compare banyak wajah sekaligus dengan satu operasi matrix (FaceGallery.best_matches)
+        Returns: list (match, user_data, confidence) sesuai urutan face_encodings
+        """
+        try:
+            if gallery is None or len(gallery) == 0:
+                return [(False, None, 0.0) for _ in face_encodings]
             
-            # Validate quality
-            is_valid, error_msg = self.validate_image_quality(image)
-            if not is_valid:
-                print(f"❌ Quality check failed: {error_msg}")
-                continue
+            results = []
+            for best_match, best_distance, *_ in gallery.best_matches(face_encodings):
+                matched, best_score = self._decide(best_distance)
+                print(f"{'✅' if matched else '❌'} {best_match['nama']}: "
+                      f"distance {best_distance:.4f}, confidence {best_score:.1f}%")
+                results.append((matched, best_match if matched else None, best_score))
             
-            # Encode dengan num_jitters=3 untuk balance
-            encoding, error = self.encode_face(image, num_jitters=3)
+            return results
             
+        except Exception as e:
+            print(f"❌ Error comparing faces: {e}")
+            return [(False, None, 0.0) for _ in face_encodings]
+    
+    def detect_frame(self, image, profile=None):
+        """
+        Tahap deteksi registrasi untuk frame yang lolos analyze_frame
+        dhash dihitung dari crop wajah (bukan frame penuh): dua frame dengan latar
+        sama tetapi wajah/pose berbeda tidak dianggap duplikat
+        Returns: (face_location, dhash, error)
+        """
+        face_location, error = self.detect_face(image, profile or self.enroll_profile)
+        if error:
+            return None, None, error
+        
+        top, right, bottom, left = face_location
+        face = image[max(0, top):bottom, max(0, left):right]
+        if face.size == 0:
+            return None, None, "Wajah di luar frame"
+        
+        return face_location, image_dhash(face), None
+    
+    def encode_frame(self, image, face_location, profile=None):
+        """
+        Tahap encode registrasi pada wajah hasil detect_frame (tanpa decode,
+        quality check maupun deteksi ulang)
+        Returns: (encoding, error)
+        """
+        # Encode dengan profile registrasi (default 'balanced' = 3 jitters)
+        profile = profile or self.enroll_profile
+        try:
+            encodings = face_recognition.face_encodings(
+                image,
+                [face_location],
+                num_jitters=profile['num_jitters']
+            )
+        except Exception as e:
+            print(f"❌ Error encoding face: {e}")
+            return None, f"Error: {str(e)}"
+        
+        if len(encodings) == 0:
+            return None, "Gagal mengekstrak encoding wajah"
+        
+        return encodings[0], None
+    
+    def prepare_checkin(self, image_data):
+        """
+        Bagian CPU-bound check-in dalam satu panggilan (untuk executor mode ASGI):
+        decode (fast) + quality check + detect + encode
+        Returns: (image, encoding, face_location, error)
+        """
+        image = self.decode_image(image_data, fast=True)
+        if image is None:
+            return None, None, None, "Invalid image format"
+        
+        is_valid, error_msg = self.validate_image_quality(image)
+        if not is_valid:
+            return None, None, None, error_msg
+        
+        encoding, face_location, error = self.detect_and_encode(image)
+        if error:
+            return None, None, None, error
+        
+        return image, encoding, face_location, None
+    
+    def analyze_frame(self, image_data):
+        """
+        Tahap murah registrasi: decode + quality record, tanpa deteksi wajah
+        Image hasil decode ikut dikembalikan agar tahap encode tidak decode ulang
+        Returns: (image, quality, error)
+        """
+        image = self.decode_image(image_data)
+        if image is None:
+            return None, None, "Failed to convert"
+        
+        quality = self.analyze_quality(image)
+        is_valid, error_msg = self.check_quality(quality)
+        if not is_valid:
+            return None, None, f"Quality check failed: {error_msg}"
+        
+        return image, quality, None
+    
+    def _map_frames(self, worker_fn, local_fn, args_list):
+        """Jalankan per frame, paralel di process pool jika diaktifkan. Hasil tetap urut input"""
+        if Config.ENABLE_PARALLEL_PROCESSING and Config.MAX_WORKERS > 1 and len(args_list) > 1:
+            try:
+                pool = get_process_pool()
+                return list(pool.map(worker_fn, args_list))
+            except BrokenProcessPool as e:
+                print(f"⚠️ Process pool broken, fallback ke serial: {e}")
+                _reset_process_pool()
+        
+        return [local_fn(*args) for args in args_list]
+    
+    def _detect_frames(self, images, profile):
+        """Lokasi wajah + dhash crop wajah untuk frame yang lolos quality check"""
+        return self._map_frames(
+            _detect_frame_in_worker,
+            self.detect_frame,
+            [(img, profile) for img in images]
+        )
+    
+    def _encode_frames(self, frames, profile):
+        """Encode list (image, face_location) hasil tahap deteksi"""
+        return self._map_frames(
+            _encode_frame_in_worker,
+            self.encode_frame,
+            [(img, face_location, profile) for img, face_location in frames]
+        )
+    
+    def _analyze_frames(self, images):
+        """Decode + quality record semua frame (tanpa encoding), image ikut dikembalikan"""
+        return self._map_frames(_analyze_frame_in_worker, self.analyze_frame, [(img,) for img in images])
+    
+    def process_multiple_images(self, images):
+        """
+        Process multiple images dengan quality filtering
+        1. Decode + quality record (murah) untuk semua frame, urut dari paling tajam
+        2. Per batch: deteksi wajah + dhash crop wajah; wajah hampir identik dengan
+           yang sudah dipilih ditunda (tidak di-encode)
+        3. Encode wajah yang berbeda, berhenti setelah REGISTRATION_MAX_ENCODINGS encoding
+        Jika frame yang berbeda tidak cukup, encoding yang mirip lalu wajah yang ditunda
+        dipakai untuk mengisi, sehingga jumlah encoding tersimpan tetap
+        min(frame valid, REGISTRATION_MAX_ENCODINGS)
+        """
+        target = Config.REGISTRATION_MAX_ENCODINGS
+        max_hamming = Config.REGISTRATION_DEDUP_HAMMING
+        profile = self.enroll_profile
+        
+        print(f"\n{'='*60}")
+        print(f"📸 Processing {len(images)} images...")
+        print(f"{'='*60}\n")
+        
+        candidates = []
+        decoded = {}
+        for idx, (image, quality, error) in enumerate(self._analyze_frames(images)):
             if error:
-                print(f"❌ {error}")
+                print(f"❌ Image {idx + 1}/{len(images)}: {error}")
                 continue
+            candidates.append((idx, quality))
+            decoded[idx] = image
+        
+        candidates.sort(key=lambda item: item[1]['sharpness'], reverse=True)
+        
+        encodings = []
+        similar = []
+        duplicates = []
+        face_hashes = []
+        encoded_frames = 0
+        step = max(1, Config.MAX_WORKERS if Config.ENABLE_PARALLEL_PROCESSING else 1)
+        
+        def encode(frames):
+            """frames: list (idx, quality, face_location). Encoding yang nyaris sama masuk `similar`"""
+            results = self._encode_frames([(decoded.pop(idx), loc) for idx, _, loc in frames], profile)
+            
+            for (idx, quality, _), (encoding, error) in zip(frames, results):
+                if error:
+                    print(f"❌ Image {idx + 1}/{len(images)}: {error}")
+                    continue
+                
+                # Encoding yang nyaris sama dengan yang sudah ada tidak menambah cakupan
+                if encodings:
+                    nearest = np.linalg.norm(np.asarray(encodings) - encoding, axis=1).min()
+                    if nearest < Config.REGISTRATION_MIN_ENCODING_DISTANCE:
+                        similar.append(encoding)
+                        continue
+                
+                encodings.append(encoding)
+                print(f"✅ Image {idx + 1}/{len(images)} encoded (sharpness: {quality['sharpness']:.1f})")
             
-            # Calculate quality score (sharpness)
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-            sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
-            
-            encodings.append(encoding)
-            quality_scores.append(sharpness)
-            
-            print(f"✅ Encoded (sharpness: {sharpness:.1f})")
+            return len(frames)
         
-        # Sort by quality dan ambil top N
-        if len(encodings) > 10:
-            # Ambil 10 terbaik
-            sorted_indices = np.argsort(quality_scores)[::-1][:10]
-            encodings = [encodings[i] for i in sorted_indices]
-            print(f"\n📊 Selected top 10 best quality images")
+        for start in range(0, len(candidates), step):
+            # Early stop: sudah cukup encoding yang berbeda
+            if len(encodings) >= target:
+                break
+            
+            batch = candidates[start:start + step]
+            distinct = []
+            
+            for (idx, quality), (face_location, face_hash, error) in zip(
+                batch, self._detect_frames([decoded[idx] for idx, _ in batch], profile)
+            ):
+                if error:
+                    print(f"❌ Image {idx + 1}/{len(images)}: {error}")
+                    decoded.pop(idx)
+                elif any(hamming_distance(face_hash, kept) <= max_hamming for kept in face_hashes):
+                    duplicates.append((idx, quality, face_location))
+                else:
+                    face_hashes.append(face_hash)
+                    distinct.append((idx, quality, face_location))
+            
+            encoded_frames += encode(distinct)
+        
+        # Frame berbeda tidak cukup: isi dengan wajah yang ditunda (tertajam dulu)
+        for start in range(0, len(duplicates), step):
+            if len(encodings) + len(similar) >= target:
+                break
+            encoded_frames += encode(duplicates[start:start + step])
+        
+        print(f"🔍 {len(candidates)} frames passed quality check, {len(duplicates)} near-duplicate faces deferred")
+        
+        encodings = (encodings + similar)[:target]
         
         print(f"\n{'='*60}")
-        print(f"✅ Total valid encodings: {len(encodings)}/{len(base64_images)}")
+        print(f"✅ Total valid encodings: {len(encodings)}/{len(images)} "
+              f"({encoded_frames} frames encoded, {len(images) - encoded_frames} skipped)")
         print(f"{'='*60}\n")
         
         return encodings
     
-    def validate_image_quality(self, image):
-        """Validate image quality"""
+    def analyze_quality(self, image):
+        """
+        Quality record satu frame: grayscale + Laplacian sekali, dipakai untuk validasi
+        dan ranking frame. Brightness dan sharpness dihitung pada resolusi asli:
+        threshold QUALITY_MIN_SHARPNESS dikalibrasi untuk ukuran asli (variance Laplacian
+        thumbnail lebih tinggi, sehingga gambar blur akan lolos)
+        Returns: dict {width, height, brightness, sharpness}
+        """
+        height, width = image.shape[:2]
+        
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+        
+        return {
+            'width': width,
+            'height': height,
+            'brightness': float(np.mean(gray)),
+            # Blur detection: variance Laplacian
+            'sharpness': float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        }
+    
+    def check_quality(self, quality):
+        """Validasi quality record dari analyze_quality. Returns: (is_valid, error)"""
+        width, height = quality['width'], quality['height']
+        
+        if width < Config.QUALITY_MIN_SIZE or height < Config.QUALITY_MIN_SIZE:
+            return False, f"Gambar terlalu kecil ({width}x{height})"
+        
+        # Check brightness (lebih permisif)
+        if quality['brightness'] < Config.QUALITY_MIN_BRIGHTNESS:
+            return False, "Gambar terlalu gelap"
+        
+        if quality['brightness'] > Config.QUALITY_MAX_BRIGHTNESS:
+            return False, "Gambar terlalu terang"
+        
+        if quality['sharpness'] < Config.QUALITY_MIN_SHARPNESS:
+            return False, "Gambar terlalu blur"
+        
+        return True, None
+    
+    def validate_image_quality(self, image, quality=None):
+        """Validate image quality (quality record dihitung jika belum ada)"""
         try:
-            height, width = image.shape[:2]
-            
-            if width < 100 or height < 100:
-                return False, f"Gambar terlalu kecil ({width}x{height})"
-            
-            # Check brightness (lebih permisif)
-            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
-            brightness = np.mean(gray)
-            
-            if brightness < 15:
-                return False, "Gambar terlalu gelap"
-            
-            if brightness > 245:
-                return False, "Gambar terlalu terang"
-            
-            # Check sharpness (blur detection)
-            laplacian_var = cv2.Laplacian(gray, cv2.CV_64F).var()
-            
-            if laplacian_var < 50:
-                return False, "Gambar terlalu blur"
-            
-            return True, None
-            
+            return self.check_quality(quality or self.analyze_quality(image))
         except Exception as e:
-            return False, f"Error validating: {str(e)}"
\ No newline at end of file
+            return False, f"Error validating: {str(e)}"
+
+def validate_face_profiles():
+    """
+    Cek profile enroll/check-in saat startup dan tampilkan nilai efektifnya
+    Returns: list warning
+    """
+    warnings = []
+    profiles = {stage: Config.get_face_profile(stage) for stage in ('enroll', 'checkin')}
+    
+    for stage, profile in profiles.items():
+        if profile['detection_model'] not in ('hog', 'cnn'):
+            warnings.append(f"{stage}: detection model '{profile['detection_model']}' tidak valid (hog/cnn)")
+        if profile['num_jitters'] < 1:
+            warnings.append(f"{stage}: num_jitters harus >= 1")
+        if profile['upsample'] < 0:
+            warnings.append(f"{stage}: upsample harus >= 0")
+        if profile['detection_model'] == 'cnn' and not getattr(dlib, 'DLIB_USE_CUDA', False):
+            warnings.append(f"{stage}: model 'cnn' tanpa CUDA sangat lambat di CPU")
+    
+    if Config.FACE_DETECTION_FALLBACK not in ('clahe', 'full', 'none'):
+        warnings.append(f"FACE_DETECTION_FALLBACK '{Config.FACE_DETECTION_FALLBACK}' tidak valid (clahe/full/none)")
+    
+    for stage, profile in profiles.items():
+        print(f"🧭 Face profile [{stage}]: {profile['name']} "
+              f"(model {profile['detection_model']}, upsample {profile['upsample']}, "
+              f"jitters {profile['num_jitters']})")
+    for warning in warnings:
+        print(f"⚠️ {warning}")
+    
+    return warnings
@@ -0,0 +1,82 @@
+"""
+Background worker untuk deferred emotion detection
+Attendance dicatat dulu (mood NULL), lalu worker mengisi kolom
+mood, mood_confidence dan mood_emoji setelah inference selesai
+
+Yang masuk antrian hanya ROI wajah (dengan margin), bukan frame penuh, dan
+jumlah job pending dibatasi EMOTION_QUEUE_SIZE: saat penuh mood di-skip
+(tetap NULL) agar memori tidak tumbuh saat inference tertinggal
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from models import Database, AttendanceModel
+
+
+class MoodWorker:
+    def __init__(self, emotion_detector):
+        self.emotion_detector = emotion_detector
+        # Default satu thread: satu model FER dipakai bergantian
+        self.executor = ThreadPoolExecutor(
+            max_workers=Config.EMOTION_WORKERS,
+            thread_name_prefix='mood-worker'
+        )
+        self._lock = threading.Lock()
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'dropped': 0
+        }
+    
+    def submit(self, attendance_id, image, face_location=None):
+        """
+        Jadwalkan emotion detection untuk satu attendance row
+        Returns: True jika masuk antrian, False jika antrian penuh (mood di-skip)
+        """
+        with self._lock:
+            pending = self._stats['submitted'] - self._stats['completed'] - self._stats['failed']
+            if Config.EMOTION_QUEUE_SIZE > 0 and pending >= Config.EMOTION_QUEUE_SIZE:
+                self._stats['dropped'] += 1
+                print(f"⚠️ Mood queue full ({pending} pending), skip mood for attendance {attendance_id}")
+                return False
+            self._stats['submitted'] += 1
+        
+        if face_location is not None:
+            # Simpan ROI saja (copy, frame penuh bisa langsung dibebaskan), box relatif ke ROI
+            roi, (x, y, w, h) = self.emotion_detector.crop_face(image, face_location)
+            image = roi.copy()
+            face_location = (y, x + w, y + h, x)
+        
+        self.executor.submit(self._run, attendance_id, image, face_location)
+        return True
+    
+    def _run(self, attendance_id, image, face_location):
+        try:
+            emotion, emotion_confidence, emoji, _ = self.emotion_detector.detect_emotion(
+                image, face_location=face_location
+            )
+            
+            with Database() as db:
+                AttendanceModel(db).update_mood(
+                    attendance_id,
+                    emotion,
+                    float(emotion_confidence),
+                    emoji
+                )
+            
+            with self._lock:
+                self._stats['completed'] += 1
+            
+            print(f"🎭 Mood updated for attendance {attendance_id}: {emoji} {emotion}")
+        except Exception as e:
+            with self._lock:
+                self._stats['failed'] += 1
+            print(f"⚠️ Deferred mood detection failed for attendance {attendance_id}: {e}")
+    
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['pending'] = stats['submitted'] - stats['completed'] - stats['failed']
+        return stats
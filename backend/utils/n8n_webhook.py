@@ -1,52 +1,433 @@
 import requests
+from requests.adapters import HTTPAdapter
 from config import Config
 from datetime import datetime
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
 
 class N8NWebhook:
-    def __init__(self):
-        self.webhook_url = Config.N8N_WEBHOOK_URL
+    """
+    Pengiriman notifikasi attendance ke n8n
     
-    def send_attendance_notification(self, user_data, attendance_data):
-        """Send attendance notification to n8n webhook"""
+    Mode async (default): notifikasi masuk antrian in-process dan dikirim
+    oleh background worker dengan retry + backoff. Setiap event juga ditulis
+    ke spool file (JSONL) sehingga event yang belum terkirim tetap ada
+    setelah restart.
+    
+    Mode batch (opt-in, hanya untuk async): beberapa event digabung menjadi
+    satu POST berisi JSON array. Batch dikirim saat mencapai batch_size
+    event atau batch_window detik sejak event pertama.
+    """
+    
+    def __init__(self, webhook_url=None, async_delivery=None, spool_path=None,
+                 batch_enabled=None, batch_size=None, batch_window=None):
+        self.webhook_url = webhook_url if webhook_url is not None else Config.N8N_WEBHOOK_URL
+        self.timeout = Config.WEBHOOK_TIMEOUT
+        self.async_delivery = Config.WEBHOOK_ASYNC if async_delivery is None else async_delivery
+        self.max_retries = Config.WEBHOOK_MAX_RETRIES
+        self.backoff = Config.WEBHOOK_RETRY_BACKOFF
+        self.backoff_max = Config.WEBHOOK_RETRY_BACKOFF_MAX
+        self.spool_path = spool_path if spool_path is not None else Config.WEBHOOK_SPOOL_FILE
+        
+        self.batch_enabled = Config.WEBHOOK_BATCH_ENABLED if batch_enabled is None else batch_enabled
+        self.batch_size = max(1, batch_size if batch_size is not None else Config.WEBHOOK_BATCH_SIZE)
+        self.batch_window = batch_window if batch_window is not None else Config.WEBHOOK_BATCH_WINDOW
+        
+        # Satu HTTP session (keep-alive) untuk semua request
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=2))
         
+        self.queue = queue.Queue(maxsize=Config.WEBHOOK_QUEUE_SIZE)
+        self._queued_ids = set()
+        # True jika ada event di spool yang belum masuk antrian (antrian penuh)
+        self._spilled = False
+        self._spool_lock = threading.Lock()
+        
+        # Retry habis karena error sementara (n8n down / 5xx / timeout): event tetap
+        # pending di spool dan pengiriman dijeda sampai _retry_at (backoff bertingkat)
+        self._retry_at = 0.0
+        self._outages = 0
+        # Event yang ditolak permanen (4xx selain 429) disimpan di sini, tidak hilang
+        self.dead_letter_path = f"{self.spool_path}.failed" if self.spool_path else None
+        
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._stop = threading.Event()
+        
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'enqueued': 0,
+            'spilled': 0,
+            'delivered': 0,
+            'failed': 0,
+            'deferred': 0,
+            'requests': 0,
+            'retries': 0,
+            'latency_last_ms': 0.0,
+            'latency_max_ms': 0.0,
+            'latency_total_ms': 0.0,
+            'last_error': None
+        }
+    
+    def is_configured(self):
         # Skip if webhook URL is default/not configured
-        if not self.webhook_url or 'your-n8n-instance' in self.webhook_url:
+        return bool(self.webhook_url) and 'your-n8n-instance' not in self.webhook_url
+    
+    def is_async(self):
+        return self.async_delivery and self.is_configured()
+    
+    def build_payload(self, user_data, attendance_data):
+        return {
+            "nama": user_data['nama'],
+            "nim": user_data['nim'],
+            "timestamp": attendance_data['timestamp'].isoformat() if isinstance(attendance_data['timestamp'], datetime) else str(attendance_data['timestamp']),
+            "status": attendance_data['status'],
+            "confidence_score": float(attendance_data['confidence_score']),
+            "date": datetime.now().strftime("%Y-%m-%d"),
+            "time": datetime.now().strftime("%H:%M:%S")
+        }
+    
+    def send_attendance_notification(self, user_data, attendance_data):
+        """Send (atau antrikan) attendance notification ke n8n webhook"""
+        
+        if not self.is_configured():
             print("⚠️ N8N webhook not configured, skipping notification")
             return True, "N8N webhook not configured (skipped)"
         
         try:
-            payload = {
-                "nama": user_data['nama'],
-                "nim": user_data['nim'],
-                "timestamp": attendance_data['timestamp'].isoformat() if isinstance(attendance_data['timestamp'], datetime) else str(attendance_data['timestamp']),
-                "status": attendance_data['status'],
-                "confidence_score": float(attendance_data['confidence_score']),
-                "date": datetime.now().strftime("%Y-%m-%d"),
-                "time": datetime.now().strftime("%H:%M:%S")
-            }
+            payload = self.build_payload(user_data, attendance_data)
             
-            response = requests.post(
+            if self.async_delivery:
+                return self.enqueue(payload)
+            
+            return self._send_sync(payload, user_data['nama'])
+        except Exception as e:
+            print(f"⚠️ Unexpected error sending webhook: {e}")
+            return False, f"Error tidak terduga: {str(e)}"
+    
+    def _send_sync(self, payload, nama):
+        """Pengiriman langsung (mode lama, WEBHOOK_ASYNC=False)"""
+        try:
+            response = self.session.post(
                 self.webhook_url,
                 json=payload,
-                timeout=5 
+                timeout=self.timeout
             )
             
             if response.status_code == 200:
-                print(f"✅ Successfully sent notification for {user_data['nama']}")
+                print(f"✅ Successfully sent notification for {nama}")
                 return True, "Notifikasi berhasil dikirim"
             else:
                 print(f"⚠️ Failed to send notification: {response.status_code}")
                 return False, f"Gagal mengirim notifikasi: {response.status_code}"
-                
+        
         except requests.exceptions.Timeout:
             print("⚠️ Webhook request timeout")
             return False, "Timeout mengirim notifikasi (data tetap tersimpan)"
         except requests.exceptions.RequestException as e:
             print(f"⚠️ Webhook request error: {e}")
             return False, f"Error mengirim notifikasi: {str(e)}"
-        except Exception as e:
-            print(f"⚠️ Unexpected error sending webhook: {e}")
-            return False, f"Error tidak terduga: {str(e)}"
+    
+    # ============= ASYNC QUEUE =============
+    
+    def enqueue(self, payload):
+        """Masukkan event ke antrian, return langsung tanpa menunggu HTTP"""
+        event = {
+            'id': uuid.uuid4().hex,
+            'payload': payload,
+            'enqueued_at': time.time()
+        }
+        
+        self._ensure_worker()
+        
+        with self._spool_lock:
+            self._spool_append({'op': 'add', 'event': event})
+            
+            try:
+                self.queue.put_nowait(event)
+                self._queued_ids.add(event['id'])
+                spilled = False
+            except queue.Full:
+                # Event tetap aman di spool, worker mengambilnya saat antrian kosong
+                self._spilled = True
+                spilled = True
+        
+        with self._stats_lock:
+            self._stats['enqueued'] += 1
+            if spilled:
+                self._stats['spilled'] += 1
+        
+        if spilled:
+            print("⚠️ Webhook queue full, notification spilled to disk")
+            return True, "Notifikasi disimpan di antrian (disk)"
+        
+        return True, "Notifikasi masuk antrian"
+    
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(
+                    target=self._run, name='n8n-webhook-worker', daemon=True
+                )
+                self._worker.start()
+    
+    def start(self):
+        """Start worker dan kirim ulang event dari spool (sisa run sebelumnya)"""
+        if self.is_async():
+            self._ensure_worker()
+    
+    def stop(self, timeout=5):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+    
+    def _run(self):
+        self._refill_from_spool()
+        
+        while not self._stop.is_set():
+            try:
+                event = self.queue.get(timeout=1.0)
+            except queue.Empty:
+                if self._spilled:
+                    if self._refill_due():
+                        self._refill_from_spool()
+                else:
+                    self._compact_spool()
+                continue
+            
+            if not self._refill_due():
+                # n8n sedang down: event tetap di spool, dikirim ulang setelah jeda
+                with self._spool_lock:
+                    self._queued_ids.discard(event['id'])
+                    self._spilled = True
+                continue
+            
+            events = [event]
+            if self.batch_enabled:
+                events.extend(self._collect_batch())
+            
+            self._deliver_with_retry(events)
+            
+            with self._spool_lock:
+                for delivered in events:
+                    self._queued_ids.discard(delivered['id'])
+            
+            if self._spilled and self.queue.empty() and self._refill_due():
+                self._refill_from_spool()
+    
+    def _refill_due(self):
+        return time.monotonic() >= self._retry_at
+    
+    def _collect_batch(self):
+        """Ambil event berikutnya sampai batch_size atau batch_window tercapai"""
+        batch = []
+        deadline = time.monotonic() + self.batch_window
+        
+        while len(batch) + 1 < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        return batch
+    
+    def _deliver_with_retry(self, events):
+        """Kirim satu event (object) atau satu batch (JSON array) dengan retry"""
+        last_error = None
+        permanent = False
+        
+        if self.batch_enabled:
+            body = [event['payload'] for event in events]
+        else:
+            body = events[0]['payload']
+        
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                with self._stats_lock:
+                    self._stats['retries'] += 1
+                # Exponential backoff + jitter
+                delay = min(self.backoff * (2 ** (attempt - 1)), self.backoff_max)
+                if self._stop.wait(delay * (0.5 + random.random() / 2)):
+                    # Shutdown: event tetap di spool untuk run berikutnya
+                    return False
+            
+            try:
+                with self._stats_lock:
+                    self._stats['requests'] += 1
+                
+                response = self.session.post(
+                    self.webhook_url,
+                    json=body,
+                    timeout=self.timeout
+                )
+                
+                if 200 <= response.status_code < 300:
+                    self._record_delivered(events)
+                    return True
+                
+                last_error = f"HTTP {response.status_code}"
+                # 4xx (kecuali 429) tidak akan berhasil jika diulang
+                if 400 <= response.status_code < 500 and response.status_code != 429:
+                    permanent = True
+                    break
+            except requests.exceptions.RequestException as e:
+                last_error = str(e)
+        
+        with self._stats_lock:
+            self._stats['last_error'] = last_error
+        
+        if permanent:
+            # Ditolak n8n: pindahkan ke dead-letter file, baru di-ack dari spool
+            print(f"⚠️ Webhook rejected {len(events)} notification(s): {last_error} (moved to {self.dead_letter_path})")
+            with self._spool_lock:
+                self._dead_letter(events, last_error)
+                self._spool_append([
+                    {'op': 'ack', 'id': event['id'], 'status': 'failed'} for event in events
+                ])
+            with self._stats_lock:
+                self._stats['failed'] += len(events)
+            return False
+        
+        # Error sementara: tidak di-ack, event tetap pending di spool dan dikirim
+        # ulang setelah jeda (naik dua kali lipat per outage, max backoff_max)
+        self._outages += 1
+        delay = min(self.backoff * (2 ** (self.max_retries + self._outages - 1)), self.backoff_max)
+        self._retry_at = time.monotonic() + delay
+        with self._spool_lock:
+            self._spilled = True
+        with self._stats_lock:
+            self._stats['deferred'] += len(events)
+        
+        print(f"⚠️ Webhook delivery failed for {len(events)} notification(s): {last_error} "
+              f"(kept in spool, retry in {delay:.0f}s)")
+        return False
+    
+    def _dead_letter(self, events, error):
+        """Append event yang ditolak permanen ke dead-letter file (caller memegang _spool_lock)"""
+        if not self.dead_letter_path:
+            return
+        try:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(
+                    json.dumps({'event': event, 'error': error, 'failed_at': time.time()}) + '\n'
+                    for event in events
+                ))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"⚠️ Webhook dead-letter write error: {e}")
+    
+    def _record_delivered(self, events):
+        self._outages = 0
+        with self._spool_lock:
+            self._spool_append([
+                {'op': 'ack', 'id': event['id'], 'status': 'delivered'} for event in events
+            ])
+        
+        now = time.time()
+        latencies = [(now - event['enqueued_at']) * 1000 for event in events]
+        
+        with self._stats_lock:
+            self._stats['delivered'] += len(events)
+            self._stats['latency_last_ms'] = latencies[-1]
+            self._stats['latency_total_ms'] += sum(latencies)
+            self._stats['latency_max_ms'] = max(self._stats['latency_max_ms'], max(latencies))
+        
+        if len(events) == 1:
+            print(f"✅ Successfully sent notification for {events[0]['payload'].get('nama')} ({latencies[0]:.0f}ms)")
+        else:
+            print(f"✅ Successfully sent batch of {len(events)} notifications ({max(latencies):.0f}ms)")
+    
+    # ============= SPOOL FILE =============
+    
+    def _spool_append(self, records):
+        """Append record JSONL, satu dict atau list (caller memegang _spool_lock)"""
+        if not self.spool_path:
+            return
+        if isinstance(records, dict):
+            records = [records]
+        try:
+            with open(self.spool_path, 'a', encoding='utf-8') as f:
+                f.write(''.join(json.dumps(record) + '\n' for record in records))
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            print(f"⚠️ Webhook spool write error: {e}")
+    
+    def _load_pending(self):
+        """Event di spool yang belum di-ack, sesuai urutan masuk"""
+        if not self.spool_path or not os.path.exists(self.spool_path):
+            return []
+        
+        pending = {}
+        try:
+            with open(self.spool_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Baris terakhir bisa terpotong saat crash
+                        continue
+                    if record.get('op') == 'add':
+                        pending[record['event']['id']] = record['event']
+                    elif record.get('op') == 'ack':
+                        pending.pop(record.get('id'), None)
+        except OSError as e:
+            print(f"⚠️ Webhook spool read error: {e}")
+        
+        return list(pending.values())
+    
+    def _refill_from_spool(self):
+        with self._spool_lock:
+            pending = [e for e in self._load_pending() if e['id'] not in self._queued_ids]
+            
+            self._spilled = False
+            for event in pending:
+                try:
+                    self.queue.put_nowait(event)
+                    self._queued_ids.add(event['id'])
+                except queue.Full:
+                    self._spilled = True
+                    break
+        
+        if pending:
+            print(f"📨 Webhook spool: {len(pending)} pending notification(s) re-queued")
+    
+    def _compact_spool(self):
+        """Kosongkan spool jika semua event sudah selesai"""
+        with self._spool_lock:
+            if self._queued_ids or self._spilled or not self.spool_path:
+                return
+            try:
+                if os.path.exists(self.spool_path) and os.path.getsize(self.spool_path) > 0:
+                    open(self.spool_path, 'w').close()
+            except OSError as e:
+                print(f"⚠️ Webhook spool compact error: {e}")
+    
+    def get_stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['latency_avg_ms'] = (stats['latency_total_ms'] / stats['delivered']) if stats['delivered'] else 0.0
+        stats['queue_depth'] = self.queue.qsize()
+        stats['spool_pending'] = self._spilled
+        stats['retry_in_s'] = max(0.0, round(self._retry_at - time.monotonic(), 1))
+        stats['async'] = self.async_delivery
+        stats['batch_enabled'] = self.batch_enabled
+        stats['batch_size'] = self.batch_size
+        stats['worker_alive'] = self._worker is not None and self._worker.is_alive()
+        return stats
     
     def test_connection(self):
         """Test n8n webhook connection"""
@@ -57,7 +438,7 @@ class N8NWebhook:
                 "timestamp": datetime.now().isoformat()
             }
             
-            response = requests.post(
+            response = self.session.post(
                 self.webhook_url,
                 json=test_payload,
                 timeout=5
@@ -65,4 +446,4 @@ class N8NWebhook:
             
             return response.status_code == 200
         except:
-            return False
\ No newline at end of file
+            return False
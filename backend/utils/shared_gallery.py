@@ -0,0 +1,170 @@
+"""
+Snapshot gallery yang dibagi antar worker process (pre-fork, gunicorn.conf.py)
+Matrix encoding ditulis sekali per generation sebagai file .npy di tmpfs (/dev/shm),
+worker lain memetakannya dengan np.load(mmap_mode='r'): zero-copy, page cache
+yang sama dipakai semua worker. Metadata (user + jumlah encoding per user)
+ditulis terakhir sebagai penanda snapshot lengkap.
+
+Swap generation: setiap file ditulis ke nama sementara lalu os.replace (atomic),
+dan worker mengganti referensi gallery-nya di bawah lock EncodingCache.
+Snapshot lama yang masih di-map tetap valid walaupun file-nya sudah dihapus
+
+Generation saja tidak unik: setelah database di-reset (schema.sql) generation
+mulai lagi dari 0, dan dua deployment dengan DB_NAME sama berbagi directory.
+Metadata menyimpan epoch database (gallery_version.epoch) dan nama file matrix
+(yang juga memuat epoch). Snapshot dengan epoch lain tidak di-map dan ditimpa
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import numpy as np
+from config import Config
+from utils.face_gallery import FaceGallery, ENCODING_DIM
+
+SNAPSHOT_PATTERN = re.compile(r'^gallery-(\d+)(-\w+)?\.(npy|json)$')
+
+
+def default_shared_dir():
+    """tmpfs jika ada (Linux), selain itu temp dir biasa. Dipisah per database"""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, f"face-gallery-{Config.DB_NAME}")
+
+
+class SharedGalleryStore:
+    def __init__(self, directory=None, keep=None):
+        self.directory = directory or Config.GALLERY_SHARED_DIR or default_shared_dir()
+        # Jumlah generation terakhir yang dipertahankan di disk
+        self.keep = max(1, Config.GALLERY_SHARED_KEEP if keep is None else keep)
+        
+        self._lock = threading.Lock()
+        self._stats = {
+            'published': 0,
+            'mapped': 0,
+            'misses': 0,
+            'stale': 0,
+            'errors': 0
+        }
+    
+    def _meta_path(self, generation):
+        return os.path.join(self.directory, f"gallery-{generation}.json")
+    
+    def _read_meta(self, generation):
+        with open(self._meta_path(generation), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+    
+    def publish(self, gallery, generation, epoch):
+        """
+        Tulis snapshot gallery untuk (epoch, generation). No-op jika sudah ada,
+        snapshot generation yang sama dari epoch lain ditimpa
+        """
+        if epoch is None:
+            return False
+        
+        previous = None
+        try:
+            previous = self._read_meta(generation)
+            if previous.get('epoch') == epoch:
+                return False
+        except (OSError, ValueError):
+            pass
+        
+        matrix_name = f"gallery-{generation}-{epoch}.npy"
+        matrix_path = os.path.join(self.directory, matrix_name)
+        meta_path = self._meta_path(generation)
+        
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            
+            with open(matrix_path + suffix, 'wb') as f:
+                np.save(f, np.ascontiguousarray(gallery.matrix, dtype=np.float32))
+            os.replace(matrix_path + suffix, matrix_path)
+            
+            meta = {
+                'generation': generation,
+                'epoch': epoch,
+                'matrix': matrix_name,
+                'users': gallery.users,
+                'counts': [int(c) for c in gallery.counts]
+            }
+            with open(meta_path + suffix, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+            os.replace(meta_path + suffix, meta_path)
+        except OSError as e:
+            self._count('errors')
+            print(f"⚠️ Shared gallery publish failed (generation {generation}): {e}")
+            return False
+        
+        if previous is not None and previous.get('matrix') not in (None, matrix_name):
+            # Matrix epoch lama; worker yang masih me-map-nya tidak terpengaruh
+            try:
+                os.remove(os.path.join(self.directory, previous['matrix']))
+            except OSError:
+                pass
+        
+        self._count('published')
+        self._prune(generation)
+        return True
+    
+    def load(self, generation, epoch):
+        """
+        Map snapshot (epoch, generation). Returns: FaceGallery, atau None jika
+        belum dipublish atau milik epoch lain (database lain / sebelum reset)
+        """
+        if epoch is None:
+            return None
+        
+        try:
+            meta = self._read_meta(generation)
+            if meta.get('epoch') != epoch:
+                self._count('stale')
+                return None
+            
+            matrix_path = os.path.join(self.directory, os.path.basename(meta['matrix']))
+            counts = meta['counts']
+            if sum(counts) == 0:
+                gallery = FaceGallery()
+            else:
+                matrix = np.load(matrix_path, mmap_mode='r')
+                if matrix.shape != (sum(counts), ENCODING_DIM) or matrix.dtype != np.float32:
+                    raise ValueError(f"unexpected matrix {matrix.shape} {matrix.dtype}")
+                # View ndarray biasa di atas mapping (tanpa copy)
+                gallery = FaceGallery.from_matrix(np.asarray(matrix), meta['users'], counts)
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            self._count('errors')
+            print(f"⚠️ Shared gallery snapshot {generation} unreadable: {e}")
+            return None
+        
+        self._count('mapped')
+        return gallery
+    
+    def _prune(self, generation):
+        """Hapus snapshot yang lebih lama dari `keep` generation terakhir"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        
+        for name in names:
+            found = SNAPSHOT_PATTERN.match(name)
+            if found and int(found.group(1)) <= generation - self.keep:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+    
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['directory'] = self.directory
+        return stats
@@ -0,0 +1,139 @@
+"""
+Startup helpers: timing per stage, lazy import model, dan warm-up paralel
+- timed(stage): catat durasi satu tahap startup (import, load model, warm-up)
+- LazyModule: modul berat (face_recognition/dlib, fer/TensorFlow) baru di-import
+  saat atribut pertama kali dipakai, thread-safe
+- Warmup: load + dummy inference beberapa model secara paralel di background,
+  statusnya dipakai oleh endpoint readiness (/api/ready)
+"""
+
+import importlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+_timings = {}
+_timings_lock = threading.Lock()
+
+
+def record_timing(stage, seconds):
+    with _timings_lock:
+        _timings[stage] = round(seconds * 1000, 1)
+
+
+@contextmanager
+def timed(stage):
+    """Catat durasi blok sebagai stage (ms), tampil di get_timings() dan /api/ready"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        record_timing(stage, elapsed)
+        print(f"⏱️ {stage}: {elapsed * 1000:.0f}ms")
+
+
+def get_timings():
+    """dict stage -> durasi ms, urut sesuai waktu selesai"""
+    with _timings_lock:
+        return dict(_timings)
+
+
+class LazyModule:
+    """
+    Proxy modul yang di-import saat atribut pertama diakses
+    Import dijaga lock (double-checked) sehingga request paralel tidak
+    me-load model yang sama dua kali
+    """
+    
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+    
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    with timed(f"import:{self._name}"):
+                        self._module = importlib.import_module(self._name)
+        return self._module
+    
+    @property
+    def loaded(self):
+        return self._module is not None
+    
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+
+class Warmup:
+    """
+    Jalankan beberapa task warm-up (name -> callable) paralel, setiap task sekali per process
+    Task yang belum pernah dijalankan boleh di-start belakangan (misalnya dlib di
+    master gunicorn, FER di setiap worker setelah fork)
+    """
+    
+    def __init__(self):
+        self.state = 'idle'  # idle -> running -> ready / failed
+        self.tasks = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+    
+    def start(self, tasks, wait=False):
+        """Mulai warm-up di background. wait=True menunggu sampai selesai (misalnya sebelum fork)"""
+        with self._lock:
+            tasks = {name: fn for name, fn in tasks.items() if name not in self.tasks}
+            if self.state == 'running' or not tasks:
+                return False
+            self.state = 'running'
+            self.tasks.update({name: 'pending' for name in tasks})
+            self._done.clear()
+        
+        thread = threading.Thread(target=self._run, args=(tasks,), name='warmup', daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return True
+    
+    def _run(self, tasks):
+        with timed('warmup:total'):
+            with ThreadPoolExecutor(max_workers=max(1, len(tasks)), thread_name_prefix='warmup') as executor:
+                futures = {name: executor.submit(self._run_task, name, fn) for name, fn in tasks.items()}
+                for future in futures.values():
+                    future.result()
+        
+        with self._lock:
+            self.state = 'failed' if self.errors else 'ready'
+        self._done.set()
+    
+    def _run_task(self, name, fn):
+        with self._lock:
+            self.tasks[name] = 'running'
+        try:
+            with timed(f"warmup:{name}"):
+                fn()
+            status = 'ready'
+        except Exception as e:
+            print(f"❌ Warm-up {name} failed: {e}")
+            status = 'failed'
+            with self._lock:
+                self.errors[name] = str(e)
+        with self._lock:
+            self.tasks[name] = status
+    
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+    
+    def is_ready(self):
+        return self.state == 'ready'
+    
+    def get_status(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'tasks': dict(self.tasks),
+                'errors': dict(self.errors)
+            }